@@ -1,6 +1,6 @@
 import numpy as np
 
-from wrappa import WrappaObject, WrappaImage
+from wrappa import WrappaObject, encode_images
 
 
 class DSModel:
@@ -14,14 +14,8 @@ class DSModel:
         responses = []
         for obj in data:
             img = obj.image.as_ndarray
-            resp = []
-            for _ in range(4):
-                rotated_img = np.rot90(img)
-                _resp = WrappaObject(WrappaImage.init_from_ndarray(
-                    payload=rotated_img,
-                    ext=obj.image.ext,
-                ))
-                resp.append(_resp)
-                img = rotated_img
-            responses.append(resp)
+            rotated_imgs = [np.rot90(img, k) for k in range(1, 5)]
+            # Images are encoded in parallel when response is sent
+            images = encode_images(rotated_imgs, ext=obj.image.ext, lazy=True)
+            responses.append([WrappaObject(image) for image in images])
         return responses
@@ -52,7 +52,7 @@ install_requires = [
     'numpy>=1.14.0',
     'Pillow>=5.0.0',
     'motor>=2.0.0',
-    'pdf2image>=1.5.4',
+    'pdf2image>=1.14.0',
 ]
 
 CONFIG = {
@@ -70,7 +70,12 @@ CONFIG = {
             'wrappa-validate = wrappa.validate:main'
         ],
     },
+    'python_requires': '>=3.9',
     'install_requires': install_requires,
+    'extras_require': {
+        # Faster JSON responses
+        'fast': ['orjson>=3.0.0'],
+    },
     'cmdclass': {
         'pylint': PylintCommand
     },
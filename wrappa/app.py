@@ -6,7 +6,7 @@ import consul
 from aiohttp import web
 from motor.motor_asyncio import AsyncIOMotorClient
 
-from .common import read_config
+from .common import read_config, HTTPClient, DownloadCache
 from .resources import Healthcheck, Predict
 from .storage import FileStorage
 
@@ -57,14 +57,26 @@ class App:
             debug=self._debug,
             client_max_size=max_request_size
         )
-        # TODO: figure out what to do with timeout
+
+        # Connection pool for downloading of url inputs
+        downloads = dict(kw.get('downloads', {}))
+        cache = None
+        if downloads.get('cache') is not None:
+            cache = DownloadCache(**downloads['cache'])
+        downloads['cache'] = cache
+        self._http_client = HTTPClient(**downloads)
+        app.on_cleanup.append(self._on_cleanup)
 
         healthchecker = healthcheck_class()
-        predictor = predict_class(db=self._db, **kw)
+        predictor = predict_class(
+            db=self._db, http_client=self._http_client, **kw)
+        self._predictor = predictor
 
         app.add_routes([web.get('/healthcheck', healthchecker.get)])
         app.add_routes([web.post('/predict', predictor.post)])
         app.add_routes([web.get('/result/{task_id}', predictor.result)])
+        app.add_routes([web.post('/status', predictor.status)])
+        app.add_routes([web.get('/stats', predictor.stats)])
 
         for path in kw.get('ds_model_config', {}).get('predict_aliases', []):
             app.add_routes([web.post(path, predictor.post)])
@@ -94,6 +106,10 @@ class App:
 
         _consul.kv.put(server_name, json.dumps(server_info, indent=4))
 
+    async def _on_cleanup(self, _app):
+        await self._predictor.close()
+        await self._http_client.close()
+
     @property
     def app(self):
         return self._app
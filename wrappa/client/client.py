@@ -1,4 +1,4 @@
-import io
+import json
 import os
 from collections import defaultdict
 from typing import TypeVar, List
@@ -6,11 +6,30 @@ from typing import TypeVar, List
 import requests
 from requests_toolbelt import MultipartEncoder, MultipartDecoder
 
-from ..models import WrappaObject, WrappaImage, WrappaFile, WrappaText
+from ..common.buffers import BufferReader
+from ..models import WrappaObject, WrappaImage, WrappaFile, WrappaText, \
+    WrappaTensor
+from ..models.tensor import DTYPE_HEADER, SHAPE_HEADER, parse_shape
 
 WrappaRequest = TypeVar('WrappaRequest', WrappaObject, List[WrappaObject])
 
 
+class StreamError(Exception):
+    """DSModel failed after some items of streamed result were sent"""
+
+    def __init__(self, error, items):
+        super().__init__(error.get('message'))
+        # Failure description sent by the server
+        self.error = error
+        # Items received before the failure
+        self.items = items
+
+
+def _is_stream_error(item):
+    return isinstance(item, dict) and list(item) == ['error'] \
+        and isinstance(item['error'], dict)
+
+
 class Client:
     def __init__(self, address: str, passphrase: str = ''):
         self._address: str = address
@@ -23,16 +42,25 @@ class Client:
             k = 'image' if key is None else 'image-{}'.format(key)
             fields[k] = (
                 data.image.name,
-                io.BytesIO(data.image.payload),
+                BufferReader(data.image.payload),
                 'image/{}'.format(data.image.ext),
             )
         if data.file is not None:
             k = 'file' if key is None else 'file-{}'.format(key)
             fields[k] = (
                 data.file.name,
-                io.BytesIO(data.file.payload),
+                BufferReader(data.file.payload),
                 'applications/octet-stream',
             )
+        if data.tensor is not None:
+            k = 'tensor' if key is None else 'tensor-{}'.format(key)
+            # Raw data of the array is sent without copying
+            fields[k] = (
+                data.tensor.raw_name,
+                BufferReader(data.tensor.buffer),
+                'application/octet-stream',
+                data.tensor.headers,
+            )
         if data.text is not None:
             k = 'text' if key is None else 'text-{}'.format(key)
             fields[k] = data.text.text
@@ -70,11 +98,24 @@ class Client:
         response.raise_for_status()
 
         if as_json:
+            if response.headers.get('Content-Type', '').startswith(
+                    'application/x-ndjson'):
+                # Streamed list result, one item per line
+                items = []
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    if _is_stream_error(item):
+                        raise StreamError(item['error'], items)
+                    items.append(item)
+                return items
             return response.json()
 
         md = MultipartDecoder.from_response(response)
 
         parts = defaultdict(WrappaObject)
+        error = None
         for part in md.parts:
             cd: bytes = part.headers[b'content-disposition']
             tmp = cd.split(b';')
@@ -95,8 +136,28 @@ class Client:
             if obj_type == b'file':
                 parts[ind].set_value(WrappaFile(
                     name=str(filename), payload=part.content))
+            if obj_type == b'tensor':
+                dtype = part.headers.get(DTYPE_HEADER.encode('utf-8'))
+                if dtype is None:
+                    tensor = WrappaTensor(
+                        name=str(filename), payload=part.content)
+                else:
+                    # Flat array unless shape is set, as on the server
+                    shape = part.headers.get(
+                        SHAPE_HEADER.encode('utf-8'), b'-1')
+                    tensor = WrappaTensor(
+                        name=str(filename), buffer=part.content,
+                        dtype=dtype.decode('utf-8'),
+                        shape=parse_shape(shape.decode('utf-8')))
+                parts[ind].set_value(tensor)
             if obj_type == b'text':
                 parts[ind].set_value(WrappaText(str(part.text)))
+            if obj_type == b'error':
+                # The last part of failed streamed result
+                error = json.loads(part.content)
+
+        if error is not None:
+            raise StreamError(error, [parts[i] for i in sorted(parts)])
 
         if parts.get(None, None):
             return parts[None]
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+import requests
+from aiohttp.test_utils import TestServer, TestClient
+
+from .. import client as client_module
+from ..client import Client, StreamError
+from ...models import WrappaObject, WrappaText
+from ...resources.tests.helpers import create_app, image_form
+
+
+class DSModel:
+    def __init__(self, **kwargs):
+        pass
+
+    def predict(self, data, as_json=False):
+        def items():
+            yield {'index': 0} if as_json else \
+                WrappaObject(WrappaText('0'))
+            raise ValueError('failed')
+        return [items() for _ in data]
+
+
+def _server_response(accept):
+    """Response of the server to be read by the client"""
+    async def main():
+        app = create_app(DSModel, output=('text', 'json', 'list'))
+        async with TestClient(TestServer(app.app)) as client:
+            resp = await client.post(
+                '/predict', data=image_form(), headers={'Accept': accept})
+            return resp.status, dict(resp.headers), await resp.read()
+
+    status, headers, body = asyncio.run(main())
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    response._content = body
+    response._content_consumed = True
+    return response
+
+
+@pytest.mark.parametrize('as_json', [True, False])
+def test_stream_failure_is_raised(monkeypatch, as_json):
+    response = _server_response(
+        'application/json' if as_json else 'multipart/form-data')
+    monkeypatch.setattr(
+        client_module.requests, 'post', lambda *args, **kwargs: response)
+
+    with pytest.raises(StreamError) as e:
+        Client('http://localhost').predict(WrappaObject(), as_json=as_json)
+
+    assert e.value.error['errno'] == 7
+    assert len(e.value.items) == 1
+    if as_json:
+        assert e.value.items == [{'index': 0}]
+    else:
+        assert e.value.items[0].text.text == '0'
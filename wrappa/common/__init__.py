@@ -1,3 +1,9 @@
+from .buffers import BufferPayload, BufferReader, as_memoryview
 from .config import read_config
+from .download_cache import DownloadCache, get_download_cache, \
+    set_download_cache
+from .http_client import HTTPClient
 from .http_utils import abort
+from .serialization import JSONSerializer, get_serializer, \
+    set_serializer
 from .errors import *
@@ -0,0 +1,85 @@
+import io
+
+from aiohttp.payload import Payload
+
+# Size of slices payload is written by, writer drains between them
+WRITE_CHUNK_SIZE = 1024 ** 2
+
+
+def as_memoryview(payload) -> memoryview:
+    """Flat byte view of bytes, bytearray, memoryview or mmap"""
+    view = memoryview(payload)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only file object over a bytes-like payload.
+    Unlike BytesIO it never copies the whole payload."""
+
+    def __init__(self, payload):
+        super().__init__()
+        self._view = as_memoryview(payload)
+        self._pos = 0
+
+    @property
+    def len(self):
+        # Bytes left, used by requests_toolbelt to size multipart parts
+        return len(self._view) - self._pos
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = len(self._view)
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, b):
+        data = self._view[self._pos:self._pos + len(b)]
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError('Negative seek position {}'.format(offset))
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class BufferPayload(Payload):
+    """Multipart payload writing bytes-like object or mmap by slices,
+    so it is neither copied nor sent in one huge write"""
+
+    def __init__(self, value, *args, **kwargs):
+        kwargs.setdefault('content_type', 'application/octet-stream')
+        super().__init__(as_memoryview(value), *args, **kwargs)
+        self._size = self._value.nbytes
+
+    def decode(self, encoding='utf-8', errors='strict'):
+        return self._value.tobytes().decode(encoding, errors)
+
+    async def write(self, writer):
+        view = self._value
+        for start in range(0, len(view), WRITE_CHUNK_SIZE):
+            await writer.write(view[start:start + WRITE_CHUNK_SIZE])
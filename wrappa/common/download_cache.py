@@ -0,0 +1,263 @@
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+_download_cache = None
+
+
+def get_download_cache():
+    return _download_cache
+
+
+def set_download_cache(cache):
+    global _download_cache
+    _download_cache = cache
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class DownloadCache:
+    """Two-tier cache of downloaded files shared by the server and
+    WrappaFile: in-memory LRU with a byte budget backed by an optional
+    on-disk store with its own budget. Files are stored by hash of their
+    content, so the same file available by several urls is stored once.
+    Cached files are revalidated with ETag/Last-Modified once they are
+    older than max_age. Metadata of up to max_urls urls is kept in memory.
+
+    Usage:
+        payload, headers = cache.lookup(url)
+        if payload is None:
+            # make request with headers
+            payload = cache.update(url, status, response_headers, body)
+    """
+
+    def __init__(self, memory_size=1024 ** 2 * 64, path=None, max_age=0,
+                 disk_size=1024 ** 3, max_urls=100000):
+        self._memory_budget = memory_size
+        self._memory_size = 0
+        # digest -> payload
+        self._memory = collections.OrderedDict()
+        # url -> meta of cached file, least recently used first
+        self._index = collections.OrderedDict()
+        self._max_urls = max_urls
+        self._disk_budget = disk_size
+        self._disk_size = 0
+        # digest -> size of blob stored on disk, least recently used first
+        self._disk = collections.OrderedDict()
+        self._path = path
+        # Seconds cached file is used without revalidation
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path is not None:
+            os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+            os.makedirs(os.path.join(path, 'urls'), exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        """Loads blobs stored on disk by mtime and removes garbage: blobs
+        over the budget, temporary files and metas of removed blobs"""
+        blobs = []
+        for entry in os.scandir(os.path.join(self._path, 'blobs')):
+            if entry.name.startswith('tmp'):
+                # Left by interrupted write
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            blobs.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, digest, size in sorted(blobs):
+            self._disk[digest] = size
+            self._disk_size += size
+        self._evict_disk()
+        for entry in os.scandir(os.path.join(self._path, 'urls')):
+            try:
+                if not entry.name.startswith('tmp'):
+                    with open(entry.path, encoding='utf-8') as f:
+                        if json.load(f)['digest'] in self._disk:
+                            continue
+            except (OSError, ValueError, KeyError):
+                pass
+            os.remove(entry.path)
+
+    def _meta_path(self, url):
+        return os.path.join(
+            self._path, 'urls', _sha256(url.encode('utf-8')) + '.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self._path, 'blobs', digest)
+
+    def _get_meta(self, url):
+        with self._lock:
+            meta = self._index.get(url)
+            if meta is not None:
+                self._index.move_to_end(url)
+        if meta is not None or self._path is None:
+            return meta
+        try:
+            with open(self._meta_path(url), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._set_meta(url, meta)
+        return meta
+
+    def _set_meta(self, url, meta):
+        with self._lock:
+            self._index[url] = meta
+            self._index.move_to_end(url)
+            while len(self._index) > self._max_urls:
+                self._index.popitem(last=False)
+
+    def _put_memory(self, digest, payload):
+        if len(payload) > self._memory_budget:
+            return
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return
+            self._memory[digest] = payload
+            self._memory_size += len(payload)
+            while self._memory_size > self._memory_budget:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _read(self, digest):
+        with self._lock:
+            payload = self._memory.get(digest)
+            if payload is not None:
+                self._memory.move_to_end(digest)
+                return payload
+        if self._path is None:
+            return None
+        try:
+            with open(self._blob_path(digest), 'rb') as f:
+                payload = f.read()
+            # mtime keeps order of blobs used across restarts
+            os.utime(self._blob_path(digest))
+        except OSError:
+            return None
+        with self._lock:
+            if digest in self._disk:
+                self._disk.move_to_end(digest)
+        self._put_memory(digest, payload)
+        return payload
+
+    def _evict_disk(self):
+        # The most recently stored blob is kept even if it's over budget
+        while self._disk_budget is not None and len(self._disk) > 1 \
+                and self._disk_size > self._disk_budget:
+            digest, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+
+    def _has(self, digest):
+        with self._lock:
+            if digest in self._memory or digest in self._disk:
+                return True
+        return self._path is not None \
+               and os.path.exists(self._blob_path(digest))
+
+    def _write(self, url, meta, payload):
+        self._set_meta(url, meta)
+        digest = meta['digest']
+        self._put_memory(digest, payload)
+        if self._path is None:
+            return
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            self._write_atomic(blob_path, payload)
+        # Blobs of urls whose content has changed are not used anymore,
+        # they are evicted as the least recently used ones
+        with self._lock:
+            if digest not in self._disk:
+                self._disk[digest] = len(payload)
+                self._disk_size += len(payload)
+            self._disk.move_to_end(digest)
+            self._evict_disk()
+        self._write_atomic(
+            self._meta_path(url), json.dumps(meta).encode('utf-8'))
+
+    def _write_atomic(self, fpath, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(fpath))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, fpath)
+        except:
+            os.remove(tmp_path)
+            raise
+
+    def lookup(self, url):
+        """Returns cached payload if it is fresh, otherwise None and
+        headers to revalidate the cached file with"""
+        meta = self._get_meta(url)
+        if meta is None:
+            return None, {}
+        if time.time() - meta['stored_at'] < self._max_age:
+            payload = self._read(meta['digest'])
+            if payload is not None:
+                with self._lock:
+                    self.hits += 1
+                return payload, {}
+        if not self._has(meta['digest']):
+            return None, {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return None, headers
+
+    def update(self, url, status, headers, payload=None):
+        """Stores downloaded payload or returns cached one if server
+        responded with 304 Not Modified"""
+        if status == 304:
+            meta = self._get_meta(url)
+            cached = self._read(meta['digest']) if meta else None
+            if cached is not None:
+                meta = dict(meta, stored_at=time.time())
+                self._set_meta(url, meta)
+                with self._lock:
+                    self.hits += 1
+                if self._path is not None:
+                    self._write_atomic(
+                        self._meta_path(url),
+                        json.dumps(meta).encode('utf-8'))
+                return cached
+            return None
+        with self._lock:
+            self.misses += 1
+        if status != 200 or payload is None:
+            return payload
+        payload = bytes(payload)
+        meta = {
+            'digest': _sha256(payload),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored_at': time.time(),
+        }
+        self._write(url, meta, payload)
+        return payload
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_size': self._memory_size,
+                'memory_items': len(self._memory),
+                'disk_size': self._disk_size,
+                'disk_items': len(self._disk),
+                'urls': len(self._index),
+            }
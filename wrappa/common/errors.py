@@ -37,7 +37,7 @@ class BaseHTTPError:
     errno = 0
 
     @classmethod
-    def json_response(cls):
+    def json_response(cls, headers=None, serializer=None):
         tb = None
         v = sys.exc_info()[1]
         errno = cls.errno
@@ -50,7 +50,7 @@ class BaseHTTPError:
             tb = v.tb
         elif v is not None:
             tb = traceback.format_exc()
-        return abort(http_code, message, errno, tb)
+        return abort(http_code, message, errno, tb, headers, serializer)
 
     @classmethod
     def if_failed(cls, func):
@@ -131,10 +131,23 @@ class AsyncTaskFailedError(BaseHTTPError):
 
 
 class HTTPRequestEntityTooLargeError(BaseHTTPError):
+    http_code = 413
     message = 'HTTP request entity too large'
     errno = 11
 
 
+class ServiceOverloadedError(BaseHTTPError):
+    http_code = 503
+    message = 'Service overloaded, retry later'
+    errno = 12
+
+
+class RequestTimeoutError(BaseHTTPError):
+    http_code = 504
+    message = 'Request deadline exceeded'
+    errno = 13
+
+
 class UnknownError(BaseHTTPError):
     http_code = 500
     message = 'Unknown error'
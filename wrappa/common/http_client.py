@@ -0,0 +1,73 @@
+import asyncio
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+
+class HTTPClient:
+    """Connection pool shared by all outgoing requests of the server"""
+
+    def __init__(self, limit=100, limit_per_host=10, timeout=30,
+                 max_size=1024 ** 2 * 100, cache=None):
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._timeout = timeout
+        # Max size (in bytes) of downloaded file
+        self._max_size = max_size
+        # DownloadCache of downloaded files
+        self.cache = cache
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=self._limit,
+                    limit_per_host=self._limit_per_host,
+                ),
+                timeout=ClientTimeout(total=self._timeout),
+            )
+        return self._session
+
+    async def download(self, url):
+        loop = asyncio.get_event_loop()
+        headers = {}
+        if self.cache is not None:
+            payload, headers = await loop.run_in_executor(
+                None, self.cache.lookup, url)
+            if payload is not None:
+                return payload
+
+        async with self.session.get(url, headers=headers) as resp:
+            if resp.status == 304 and self.cache is not None:
+                payload = await loop.run_in_executor(
+                    None, self.cache.update, url, resp.status, resp.headers)
+                if payload is None:
+                    raise ValueError(
+                        'File {url} is missing in cache'.format(url=url))
+                return payload
+            resp.raise_for_status()
+            if resp.content_length is not None \
+                    and resp.content_length > self._max_size:
+                raise ValueError(
+                    'File {url} is too large: {size} bytes'.format(
+                        url=url, size=resp.content_length))
+            data = bytearray()
+            async for chunk in resp.content.iter_chunked(2 ** 16):
+                data.extend(chunk)
+                if len(data) > self._max_size:
+                    raise ValueError(
+                        'File {url} is too large'.format(url=url))
+
+        if self.cache is not None:
+            return await loop.run_in_executor(
+                None, self.cache.update, url, resp.status, resp.headers, data)
+        # bytearray is returned as is, without copying it to bytes
+        return data
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Let underlying connections be closed
+            await asyncio.sleep(0)
+        self._session = None
@@ -1,18 +1,13 @@
-import functools
-import json
+from .serialization import get_serializer
 
-from aiohttp import web
 
-
-def abort(http_code, message, errno=None, traceback=None):
+def abort(http_code, message, errno=None, traceback=None, headers=None,
+          serializer=None):
     resp = {
         'code': http_code,
         'message': message,
         'errno': errno,
         'traceback': traceback
     }
-    return web.json_response(
-        data=resp,
-        status=http_code,
-        dumps=functools.partial(json.dumps, indent=4)
-    )
+    serializer = serializer or get_serializer()
+    return serializer.response(resp, status=http_code, headers=headers)
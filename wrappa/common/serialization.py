@@ -0,0 +1,118 @@
+import json
+
+import numpy as np
+from aiohttp import web
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('Object of type {} is not JSON serializable'.format(
+        type(obj).__name__))
+
+
+class JSONSerializer:
+    """Serializes JSON responses.
+
+    Output is compact unless indent is set. encoder is json, orjson
+    or auto, which picks orjson if it's installed. NumPy arrays and
+    scalars are serialized as lists and numbers. Lists longer than
+    chunk_size are written to the response chunk by chunk.
+    """
+
+    def __init__(self, indent=None, encoder='auto', chunk_size=1000):
+        if encoder not in ('auto', 'json', 'orjson'):
+            raise ValueError('Unknown JSON encoder: {}'.format(encoder))
+        if encoder == 'orjson' and orjson is None:
+            raise ValueError('orjson is not installed')
+        # orjson supports indent of 2 spaces only
+        if orjson is not None and encoder != 'json' \
+                and indent in (None, 2):
+            self.encoder = 'orjson'
+        else:
+            self.encoder = 'json'
+        self.indent = indent
+        self.chunk_size = chunk_size
+        self._orjson_option = 0
+        if orjson is not None:
+            self._orjson_option = \
+                orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            if indent is not None:
+                self._orjson_option |= orjson.OPT_INDENT_2
+
+    def dumpb(self, data) -> bytes:
+        if self.encoder == 'orjson':
+            return orjson.dumps(
+                data, default=_default, option=self._orjson_option)
+        return self.dumps(data).encode('utf-8')
+
+    def dumps(self, data) -> str:
+        if self.encoder == 'orjson':
+            return self.dumpb(data).decode('utf-8')
+        separators = (',', ':') if self.indent is None else None
+        return json.dumps(data, indent=self.indent, separators=separators,
+                          ensure_ascii=False, default=_default)
+
+    def dumpb_line(self, data) -> bytes:
+        """Compact line of NDJSON"""
+        if self.encoder == 'orjson':
+            return orjson.dumps(
+                data, default=_default,
+                option=self._orjson_option & ~orjson.OPT_INDENT_2
+                       | orjson.OPT_APPEND_NEWLINE)
+        line = json.dumps(data, separators=(',', ':'), ensure_ascii=False,
+                          default=_default)
+        return (line + '\n').encode('utf-8')
+
+    def iter_chunks(self, data):
+        """Yields serialized data by chunks of chunk_size list items"""
+        if not isinstance(data, list) or len(data) <= self.chunk_size:
+            yield self.dumpb(data)
+            return
+        # Chunks are indented as a whole list, so only compact
+        # output is split into chunks
+        yield b'['
+        for start in range(0, len(data), self.chunk_size):
+            chunk = self.dumpb(data[start:start + self.chunk_size])
+            if start:
+                yield b','
+            yield chunk[1:-1]
+        yield b']'
+
+    def response(self, data, status=200, headers=None) -> web.Response:
+        return web.Response(
+            body=self.dumpb(data), status=status, headers=headers,
+            content_type='application/json', charset='utf-8')
+
+    async def write(self, request, data, status=200) -> web.StreamResponse:
+        """Responds with data, big lists are serialized and sent
+        chunk by chunk, so the loop is not blocked for long"""
+        if self.indent is not None or not isinstance(data, list) \
+                or len(data) <= self.chunk_size:
+            return self.response(data, status)
+        response = web.StreamResponse(status=status)
+        response.content_type = 'application/json'
+        response.charset = 'utf-8'
+        await response.prepare(request)
+        for chunk in self.iter_chunks(data):
+            await response.write(chunk)
+        return response
+
+
+_serializer = JSONSerializer()
+
+
+def get_serializer():
+    return _serializer
+
+
+def set_serializer(serializer):
+    global _serializer
+    _serializer = serializer
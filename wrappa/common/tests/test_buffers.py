@@ -0,0 +1,54 @@
+import asyncio
+import io
+import mmap
+
+import numpy as np
+from PIL import Image
+
+from ..buffers import BufferPayload, BufferReader
+
+
+def _mmap(data):
+    buf = mmap.mmap(-1, len(data))
+    buf[:] = data
+    return buf
+
+
+def test_buffer_reader():
+    reader = BufferReader(memoryview(b'0123456789')[2:])
+
+    assert reader.read(3) == b'234'
+    assert reader.len == 5
+    assert reader.seek(-2, io.SEEK_END) == 6
+    assert reader.read() == b'89'
+    assert reader.read() == b''
+
+
+def test_image_is_decoded_from_mmap():
+    image = np.arange(4 * 5 * 3, dtype=np.uint8).reshape((4, 5, 3))
+    buf = io.BytesIO()
+    Image.fromarray(image).save(buf, 'PNG')
+
+    with BufferReader(_mmap(buf.getvalue())) as f:
+        assert np.all(np.asarray(Image.open(f)) == image)
+
+
+class _Writer:
+    def __init__(self):
+        self.chunks = []
+
+    async def write(self, chunk):
+        self.chunks.append(chunk)
+
+
+def test_buffer_payload_is_written_by_views(monkeypatch):
+    monkeypatch.setattr('wrappa.common.buffers.WRITE_CHUNK_SIZE', 4)
+    data = bytes(range(10))
+    payload = BufferPayload(_mmap(data))
+    writer = _Writer()
+
+    asyncio.run(payload.write(writer))
+
+    assert payload.size == len(data)
+    assert all(isinstance(c, memoryview) for c in writer.chunks)
+    assert b''.join(writer.chunks) == data
@@ -0,0 +1,78 @@
+from ..download_cache import DownloadCache
+
+URL = 'http://example.com/image.jpg'
+
+
+def test_revalidates_with_etag():
+    cache = DownloadCache()
+    cache.update(URL, 200, {'ETag': '"v1"'}, b'payload')
+
+    payload, headers = cache.lookup(URL)
+
+    assert payload is None
+    assert headers == {'If-None-Match': '"v1"'}
+    assert cache.update(URL, 304, {}) == b'payload'
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_returns_fresh_payload_without_revalidation():
+    cache = DownloadCache(max_age=60)
+    cache.update(URL, 200, {}, b'payload')
+
+    assert cache.lookup(URL) == (b'payload', {})
+
+
+def test_evicts_least_recently_used():
+    cache = DownloadCache(memory_size=10, max_age=60)
+    cache.update('http://a', 200, {}, b'a' * 4)
+    cache.update('http://b', 200, {}, b'b' * 4)
+    cache.lookup('http://a')
+    cache.update('http://c', 200, {}, b'c' * 4)
+
+    assert cache.lookup('http://a')[0] == b'a' * 4
+    assert cache.lookup('http://b')[0] is None
+    assert cache.stats['memory_size'] == 8
+
+
+def test_reads_files_stored_on_disk(tmpdir):
+    cache = DownloadCache(path=str(tmpdir), max_age=60)
+    cache.update(URL, 200, {'Last-Modified': 'Mon, 01 Jan 2018'}, b'data')
+    cache.update('http://mirror/image.jpg', 200, {}, b'data')
+
+    other = DownloadCache(path=str(tmpdir), max_age=60)
+
+    assert other.lookup(URL) == (b'data', {})
+    # Same content is stored once
+    assert len(tmpdir.join('blobs').listdir()) == 1
+
+
+def test_url_index_is_bounded():
+    cache = DownloadCache(max_age=60, max_urls=2)
+    for name in 'abc':
+        cache.update('http://' + name, 200, {}, b'data')
+
+    assert cache.stats['urls'] == 2
+    assert cache.lookup('http://a')[0] is None
+    assert cache.lookup('http://c')[0] == b'data'
+
+
+def test_disk_store_is_bounded(tmpdir):
+    cache = DownloadCache(memory_size=0, path=str(tmpdir), max_age=60,
+                          disk_size=10)
+    cache.update('http://a', 200, {}, b'a' * 4)
+    cache.update('http://b', 200, {}, b'b' * 4)
+    assert cache.lookup('http://a')[0] == b'a' * 4
+    # Content of url has changed, so its previous blob is evicted first
+    cache.update('http://b', 200, {}, b'c' * 4)
+
+    assert len(tmpdir.join('blobs').listdir()) == 2
+    assert cache.stats['disk_size'] == 8
+    assert cache.lookup('http://a')[0] == b'a' * 4
+    assert cache.lookup('http://b')[0] == b'c' * 4
+
+    # Metas of removed blobs are collected on start
+    cache.update('http://d', 200, {}, b'd' * 4)
+    other = DownloadCache(path=str(tmpdir), max_age=60, disk_size=10)
+    assert other.stats['disk_items'] == 2
+    assert len(tmpdir.join('urls').listdir()) == 2
@@ -0,0 +1,48 @@
+import json
+
+import numpy as np
+import pytest
+
+from .. import serialization
+from ..serialization import JSONSerializer
+
+ENCODERS = ['json']
+if serialization.orjson is not None:
+    ENCODERS.append('orjson')
+
+
+@pytest.mark.parametrize('encoder', ENCODERS)
+def test_numpy_types(encoder):
+    serializer = JSONSerializer(encoder=encoder)
+    data = {
+        'boxes': np.arange(6, dtype=np.float32).reshape((2, 3)),
+        'score': np.float64(0.5),
+        'label': np.int64(3),
+        'text': 'тест',
+    }
+
+    assert json.loads(serializer.dumpb(data)) == {
+        'boxes': [[0, 1, 2], [3, 4, 5]],
+        'score': 0.5,
+        'label': 3,
+        'text': 'тест',
+    }
+    assert serializer.dumps(data).startswith('{"boxes":[[0')
+
+
+@pytest.mark.parametrize('encoder', ENCODERS)
+def test_chunks(encoder):
+    serializer = JSONSerializer(encoder=encoder, chunk_size=3)
+    data = [{'index': i} for i in range(10)]
+
+    chunks = list(serializer.iter_chunks(data))
+
+    assert len(chunks) > 3
+    assert json.loads(b''.join(chunks)) == data
+
+
+@pytest.mark.parametrize('encoder', ENCODERS)
+def test_ndjson_line_is_compact(encoder):
+    serializer = JSONSerializer(encoder=encoder, indent=2)
+
+    assert serializer.dumpb_line({'a': [1, 2]}) == b'{"a":[1,2]}\n'
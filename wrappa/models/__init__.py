@@ -1,5 +1,8 @@
 from .base import WrappaObject
+from .batch import decode_images, encode_images, encode_pending, \
+    stack_images
 from .file import WrappaFile
 from .image import WrappaImage
 from .legacy_converter import legacy_converter
+from .tensor import WrappaTensor
 from .text import WrappaText
@@ -1,5 +1,6 @@
 from .file import WrappaFile
 from .image import WrappaImage
+from .tensor import WrappaTensor
 from .text import WrappaText
 
 
@@ -8,12 +9,15 @@ class WrappaObject:
         self._file = None
         self._image = None
         self._text = None
+        self._tensor = None
         for arg in args:
             self.set_value(arg)
 
     def set_value(self, data):
         if isinstance(data, WrappaImage) and self._image is None:
             self._image = data
+        elif isinstance(data, WrappaTensor) and self._tensor is None:
+            self._tensor = data
         elif isinstance(data, WrappaFile) and self._file is None:
             self._file = data
         elif isinstance(data, WrappaText) and self._text is None:
@@ -33,3 +37,7 @@ class WrappaObject:
     @property
     def text(self):
         return self._text
+
+    @property
+    def tensor(self):
+        return self._tensor
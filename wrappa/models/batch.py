@@ -0,0 +1,128 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from .image import WrappaImage
+from ..common.buffers import BufferReader
+
+_MODE_BY_CHANNELS = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+# Images of other modes, including palette ones, are taken as RGB
+_CHANNELS_BY_MODE = {
+    '1': 1, 'L': 1, 'I': 1, 'I;16': 1, 'F': 1,
+    'LA': 4, 'La': 4, 'PA': 4, 'RGBA': 4, 'RGBa': 4,
+}
+
+_executor = None
+
+
+def _get_executor():
+    # PIL releases GIL while decoding, so threads decode in parallel
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 1,
+            thread_name_prefix='wrappa-decode')
+    return _executor
+
+
+def _reset_executor():
+    # Threads of the pool do not survive fork
+    global _executor
+    _executor = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _open(image):
+    if image._img_as_ndarray is not None:
+        return Image.fromarray(image._img_as_ndarray)
+    return Image.open(BufferReader(image.payload))
+
+
+def decode_images(images, executor=None):
+    """Decodes payloads of WrappaImage list in a thread pool,
+    returns list of ndarrays. Result is cached in every image."""
+    executor = executor or _get_executor()
+    return list(executor.map(lambda image: image.as_ndarray, images))
+
+
+def stack_images(images, size=None, collate='resize', channels=None,
+                 dtype=np.uint8, executor=None) -> np.ndarray:
+    """Decodes WrappaImage list in a thread pool right into one
+    preallocated (N, H, W, C) array.
+
+    size is (H, W) of the result. If it is not set, images must be of the
+    same size or, with collate='pad', are padded to the biggest one.
+    collate='resize' resizes images to size, collate='pad' pads them
+    with zeros at the bottom and at the right.
+    channels is 1, 3 or 4, by default it's taken from the first image.
+    """
+    if collate not in ('resize', 'pad'):
+        raise ValueError('Unknown collate: {}'.format(collate))
+    executor = executor or _get_executor()
+    # Only headers are read here, images are decoded later
+    opened = [_open(image) for image in images]
+    if channels is None:
+        channels = _CHANNELS_BY_MODE.get(opened[0].mode, 3) if opened else 3
+    mode = _MODE_BY_CHANNELS[channels]
+
+    if size is None:
+        sizes = set(img.size for img in opened)
+        if collate == 'resize' and len(sizes) > 1:
+            raise ValueError(
+                'Images are of different sizes, set size or use pad')
+        width = max((w for w, _ in sizes), default=0)
+        height = max((h for _, h in sizes), default=0)
+    else:
+        height, width = size
+
+    if collate == 'pad':
+        batch = np.zeros((len(opened), height, width, channels), dtype=dtype)
+    else:
+        batch = np.empty((len(opened), height, width, channels), dtype=dtype)
+
+    def decode(i):
+        img = opened[i]
+        if img.mode != mode:
+            img = img.convert(mode)
+        if collate == 'resize' and img.size != (width, height):
+            img = img.resize((width, height), Image.BILINEAR)
+        arr = np.asarray(img)
+        if arr.ndim == 2:
+            arr = arr[..., np.newaxis]
+        h, w = min(arr.shape[0], height), min(arr.shape[1], width)
+        batch[i, :h, :w] = arr[:h, :w]
+
+    list(executor.map(decode, range(len(opened))))
+    return batch
+
+
+def encode_images(arrays, ext, names=None, lazy=False, executor=None,
+                  **options):
+    """Creates WrappaImage list from ndarrays encoding them in a thread
+    pool. options are passed to PIL save, see init_from_ndarray.
+    If lazy is True, images are encoded only when response is sent."""
+    names = names or [None] * len(arrays)
+    images = [
+        WrappaImage.init_from_ndarray(
+            array, ext, name=name, lazy=True, **options)
+        for array, name in zip(arrays, names)
+    ]
+    if not lazy:
+        encode_pending(images, executor)
+    return images
+
+
+def encode_pending(images, executor=None, defaults=None):
+    """Encodes in a thread pool images created with lazy=True,
+    defaults are passed to WrappaImage.encode"""
+    pending = [image for image in images if not image.is_encoded]
+    if len(pending) == 1:
+        pending[0].encode(defaults)
+    elif pending:
+        executor = executor or _get_executor()
+        list(executor.map(lambda image: image.encode(defaults), pending))
@@ -4,13 +4,19 @@ from uuid import uuid4
 
 import requests
 
+from ..common.download_cache import get_download_cache
+
 
 class WrappaFile:
-    def __init__(self, payload=None, ext=None, name=None, url=None):
+    def __init__(self, payload=None, ext=None, name=None, url=None,
+                 download_cache=None):
         self._payload = payload
         self._ext = ext
         self._url = url
         self._name = name
+        # Cache of url downloads, the one set by set_download_cache
+        # is used by default
+        self._download_cache = download_cache
 
     @property
     def payload(self):
@@ -59,12 +65,23 @@ class WrappaFile:
     def _download_file(self):
         data = None
         if self.url is not None:
-            r = requests.get(self.url, stream=True)
+            cache = self._download_cache or get_download_cache()
+            headers = {}
+            if cache is not None:
+                data, headers = cache.lookup(self.url)
+                if data is not None:
+                    return data
+            r = requests.get(self.url, stream=True, headers=headers)
+            if r.status_code == 304 and cache is not None:
+                return cache.update(self.url, r.status_code, r.headers)
             if r.status_code == 200:
                 with tempfile.TemporaryFile(mode='r+b') as f:
                     for chunk in r:
                         f.write(chunk)
                     f.seek(0)
                     data = f.read()
+                if cache is not None:
+                    data = cache.update(
+                        self.url, r.status_code, r.headers, data)
 
         return data
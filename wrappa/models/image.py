@@ -4,42 +4,70 @@ import numpy as np
 from PIL import Image
 
 from .file import WrappaFile
+from ..common.buffers import BufferReader
 
 
 class WrappaImage(WrappaFile):
     _EXT_TO_FORMAT = {
         'jpg': 'JPEG'
     }
-
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._img_as_ndarray = None
+        self._encode_options = {}
 
     @staticmethod
-    def init_from_ndarray(payload, ext, name=None) -> 'WrappaImage':
+    def init_from_ndarray(payload, ext, name=None, lazy=False,
+                          **options) -> 'WrappaImage':
+        """options are passed to PIL save, e.g. quality for jpeg
+        and webp or compress_level for png. If lazy is True, image is
+        encoded only if its payload is requested."""
         ext_to_store = ext
         if ext_to_store[0] == '.':
             ext_to_store = ext_to_store[1:]
 
-        image = Image.fromarray(payload)
+        image = WrappaImage(ext=ext_to_store, name=name)
+        image._img_as_ndarray = payload
+        image._encode_options = options
+        if not lazy:
+            image.encode()
+            # Keep previous behaviour, ndarray is decoded from payload
+            image._img_as_ndarray = None
+        return image
+
+    @staticmethod
+    def _format(ext):
         # Use PIL format name instead of extension if applicable
-        fmt = WrappaImage._EXT_TO_FORMAT.get(ext_to_store.lower(),
-                                             ext_to_store)
+        return WrappaImage._EXT_TO_FORMAT.get(ext.lower(), ext).lower()
 
-        with io.BytesIO() as f:
-            image.save(f, fmt)
-            image_as_bytes = f.getvalue()
+    @property
+    def is_encoded(self):
+        return self._payload is not None or self._img_as_ndarray is None
+
+    def encode(self, defaults=None):
+        """Encodes ndarray the image was created from, if it's not
+        encoded yet, and returns payload. defaults are PIL save options
+        by format, e.g. {'jpeg': {'quality': 90}}, options the image was
+        created with take precedence."""
+        if not self.is_encoded:
+            fmt = self._format(self.ext)
+            options = dict((defaults or {}).get(fmt, {}))
+            options.update(self._encode_options)
+            image = Image.fromarray(self._img_as_ndarray)
+            with io.BytesIO() as f:
+                image.save(f, fmt, **options)
+                self._payload = f.getvalue()
+        return self._payload
 
-        return WrappaImage(
-            ext=ext_to_store,
-            payload=image_as_bytes,
-            name=name
-        )
+    @property
+    def payload(self):
+        self.encode()
+        return super().payload
 
     @property
     def as_ndarray(self) -> np.ndarray:
         if self._img_as_ndarray is None:
-            with io.BytesIO(self.payload) as f:
+            with BufferReader(self.payload) as f:
                 self._img_as_ndarray = np.asarray(Image.open(f))
 
         return self._img_as_ndarray
@@ -0,0 +1,96 @@
+import io
+import os
+
+import numpy as np
+
+from .file import WrappaFile
+from ..common.buffers import BufferReader
+
+# Headers of multipart part with raw data of a tensor
+DTYPE_HEADER = 'X-Tensor-Dtype'
+SHAPE_HEADER = 'X-Tensor-Shape'
+
+
+def format_shape(shape):
+    return ','.join(str(x) for x in shape)
+
+
+def parse_shape(value):
+    return tuple(int(x) for x in value.split(',') if x.strip())
+
+
+class WrappaTensor(WrappaFile):
+    """ndarray passed as is, without any image codec.
+
+    payload is .npy file, buffer is raw data of an array of dtype and
+    shape. In both cases as_ndarray is a view of the received data,
+    so it's read-only.
+    """
+
+    def __init__(self, payload=None, name=None, url=None, buffer=None,
+                 dtype=None, shape=None):
+        super().__init__(payload=payload, ext='npy', name=name, url=url)
+        self._array = None
+        if buffer is not None:
+            dtype = np.dtype(dtype)
+            if dtype.hasobject:
+                raise ValueError('Tensor of objects is not supported')
+            self._array = np.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+    @staticmethod
+    def init_from_ndarray(payload, name=None) -> 'WrappaTensor':
+        tensor = WrappaTensor(name=name)
+        tensor._array = np.asarray(payload)
+        return tensor
+
+    @property
+    def payload(self):
+        if self._payload is None and self._array is not None:
+            with io.BytesIO() as f:
+                np.save(f, self._array, allow_pickle=False)
+                self._payload = f.getvalue()
+        return super().payload
+
+    @property
+    def as_ndarray(self) -> np.ndarray:
+        if self._array is None:
+            self._array = self._load(self.payload)
+        return self._array
+
+    @staticmethod
+    def _load(payload):
+        # Array is a view of .npy payload, its data is not copied
+        with BufferReader(payload) as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+        shape, fortran_order, dtype = header
+        if dtype.hasobject:
+            raise ValueError('Tensor of objects is not supported')
+        count = int(np.prod(shape))
+        array = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        if fortran_order:
+            return array.reshape(shape[::-1]).transpose()
+        return array.reshape(shape)
+
+    @property
+    def headers(self):
+        """Headers of multipart part sending the tensor as raw data"""
+        array = self.as_ndarray
+        return {
+            DTYPE_HEADER: array.dtype.str,
+            SHAPE_HEADER: format_shape(array.shape),
+        }
+
+    @property
+    def raw_name(self):
+        """Name of multipart part sending the tensor as raw data"""
+        return os.path.splitext(self.name)[0] + '.bin'
+
+    @property
+    def buffer(self):
+        """Raw data of the tensor in C order"""
+        return np.ascontiguousarray(self.as_ndarray).data
@@ -0,0 +1,101 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ..batch import decode_images, encode_images, encode_pending, \
+    stack_images
+from ..image import WrappaImage
+
+
+def _image(height, width):
+    image = np.random.randint(0, 256, size=(height, width, 3), dtype=np.uint8)
+    return image, WrappaImage.init_from_ndarray(image, 'png')
+
+
+def test_decode_images():
+    arrays, images = zip(*[_image(4, 5), _image(6, 7)])
+
+    decoded = decode_images(images)
+
+    for array, image, result in zip(arrays, images, decoded):
+        assert np.all(array == result)
+        assert image.as_ndarray is result
+
+
+def test_stack_images_of_same_size():
+    arrays, images = zip(*[_image(4, 5), _image(4, 5)])
+
+    batch = stack_images(images)
+
+    assert batch.shape == (2, 4, 5, 3)
+    assert batch.flags['C_CONTIGUOUS']
+    assert np.all(batch == np.stack(arrays))
+
+
+def test_stack_images_with_padding():
+    arrays, images = zip(*[_image(4, 5), _image(2, 8)])
+
+    batch = stack_images(images, collate='pad')
+
+    assert batch.shape == (2, 4, 8, 3)
+    assert np.all(batch[0, :, :5] == arrays[0])
+    assert np.all(batch[0, :, 5:] == 0)
+    assert np.all(batch[1, :2] == arrays[1])
+    assert np.all(batch[1, 2:] == 0)
+
+
+def test_stack_images_with_resize():
+    _, images = zip(*[_image(4, 5), _image(2, 8)])
+
+    batch = stack_images(images, size=(3, 3), channels=1)
+
+    assert batch.shape == (2, 3, 3, 1)
+
+
+def test_stack_images_channels_by_mode():
+    def encode(mode):
+        buf = io.BytesIO()
+        Image.new(mode, (5, 4)).save(buf, 'PNG')
+        return WrappaImage(payload=buf.getvalue(), ext='png')
+
+    assert stack_images([encode('P')]).shape == (1, 4, 5, 3)
+    assert stack_images([encode('LA')]).shape == (1, 4, 5, 4)
+    assert stack_images([encode('L')]).shape == (1, 4, 5, 1)
+
+
+def test_stack_images_of_different_sizes_without_size():
+    _, images = zip(*[_image(4, 5), _image(2, 8)])
+
+    with pytest.raises(ValueError):
+        stack_images(images)
+
+
+def test_encode_images():
+    arrays = [np.random.randint(0, 256, size=(16, 16, 3), dtype=np.uint8)
+              for _ in range(3)]
+
+    images = encode_images(arrays, 'png', compress_level=1)
+    lazy_images = encode_images(arrays, 'png', lazy=True)
+
+    assert all(image.is_encoded for image in images)
+    assert not any(image.is_encoded for image in lazy_images)
+    encode_pending(lazy_images)
+    for array, image, lazy_image in zip(arrays, images, lazy_images):
+        assert lazy_image.is_encoded
+        assert np.all(WrappaImage(payload=image.payload).as_ndarray == array)
+        assert np.all(
+            WrappaImage(payload=lazy_image.payload).as_ndarray == array)
+
+
+def test_encode_options():
+    array = np.random.randint(0, 256, size=(64, 64, 3), dtype=np.uint8)
+
+    high = WrappaImage.init_from_ndarray(array, 'jpg', quality=95)
+    low = WrappaImage.init_from_ndarray(array, 'jpg', quality=10)
+    default = WrappaImage.init_from_ndarray(array, 'jpg', lazy=True)
+    encode_pending([default], defaults={'jpeg': {'quality': 10}})
+
+    assert len(low.payload) < len(high.payload)
+    assert default.payload == low.payload
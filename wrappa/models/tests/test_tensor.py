@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from ..tensor import WrappaTensor, parse_shape
+
+
+def test_npy_payload_is_not_copied():
+    array = np.arange(12, dtype=np.float32).reshape((3, 4))
+    payload = bytearray(WrappaTensor.init_from_ndarray(array).payload)
+
+    tensor = WrappaTensor(payload=payload)
+
+    assert np.array_equal(tensor.as_ndarray, array)
+    assert np.shares_memory(
+        tensor.as_ndarray, np.frombuffer(payload, np.uint8))
+
+
+def test_fortran_order_npy():
+    array = np.asfortranarray(np.arange(6, dtype='>i2').reshape((2, 3)))
+
+    payload = WrappaTensor.init_from_ndarray(array).payload
+
+    tensor = WrappaTensor(payload=payload)
+
+    assert np.array_equal(tensor.as_ndarray, array)
+
+
+def test_raw_buffer():
+    array = np.arange(6, dtype=np.uint16).reshape((2, 3)).T
+    source = WrappaTensor.init_from_ndarray(array)
+
+    tensor = WrappaTensor(
+        buffer=bytes(source.buffer),
+        dtype=source.headers['X-Tensor-Dtype'],
+        shape=parse_shape(source.headers['X-Tensor-Shape']))
+
+    assert np.array_equal(tensor.as_ndarray, array)
+
+
+def test_malformed_buffer():
+    with pytest.raises(ValueError):
+        WrappaTensor(buffer=b'123', dtype='<f4', shape=(1,))
+
+
+def test_raw_data_is_not_named_as_npy():
+    tensor = WrappaTensor.init_from_ndarray(np.zeros(3), name='input.npy')
+
+    assert tensor.raw_name == 'input.bin'
+    assert WrappaTensor.init_from_ndarray(np.zeros(3)).raw_name.endswith(
+        '.bin')
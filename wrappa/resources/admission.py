@@ -0,0 +1,46 @@
+class AdmissionController:
+    """Rejects requests early once the server is overloaded, so latency
+    of admitted requests stays bounded"""
+
+    def __init__(self, max_queue_size=None, max_inflight_bytes=None,
+                 max_async_tasks=None, retry_after=1):
+        self.max_queue_size = max_queue_size
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_async_tasks = max_async_tasks
+        # Seconds client is advised to wait before retrying
+        self.retry_after = retry_after
+        self.inflight_bytes = 0
+        # Requests admitted and not released yet, including ones still
+        # being uploaded or parsed, so bursts are limited too
+        self.admitted = 0
+
+    def acquire(self, size):
+        if self.max_queue_size is not None \
+                and self.admitted >= self.max_queue_size:
+            return False
+        # Always admit a request if nothing is in flight, otherwise
+        # requests bigger than the limit would never be admitted
+        if self.max_inflight_bytes is not None and self.inflight_bytes \
+                and self.inflight_bytes + size > self.max_inflight_bytes:
+            return False
+        self.inflight_bytes += size
+        self.admitted += 1
+        return True
+
+    def release(self, size):
+        self.inflight_bytes -= size
+        self.admitted -= 1
+
+    def can_add_async_task(self, tasks_count):
+        return self.max_async_tasks is None \
+               or tasks_count < self.max_async_tasks
+
+    @property
+    def as_dict(self):
+        return {
+            'max_queue_size': self.max_queue_size,
+            'max_inflight_bytes': self.max_inflight_bytes,
+            'max_async_tasks': self.max_async_tasks,
+            'inflight_bytes': self.inflight_bytes,
+            'admitted': self.admitted,
+        }
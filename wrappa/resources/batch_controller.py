@@ -0,0 +1,117 @@
+import collections
+import math
+
+
+class AdaptiveBatchController:
+    """Tunes batch size and wait window of a route online.
+
+    If target_p99_ms is set, batch size and wait window are increased
+    while p99 latency of requests stays below the target and cut in half
+    once it is exceeded, unless requests are piling up in the queue.
+    Otherwise wait window grows until batches are full, then batch size
+    is hill-climbed towards the best measured throughput.
+    """
+
+    def __init__(self, route, min_batch_size=1, max_batch_size=32,
+                 max_wait_ms=50, target_p99_ms=None,
+                 adjust_every=10, window=1000):
+        self._route = route
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.target_p99 = (
+            target_p99_ms / 1000 if target_p99_ms is not None else None)
+        self._adjust_every = adjust_every
+        # Latencies of requests since the last adjustment
+        self._latencies = collections.deque(maxlen=window)
+        # Batches observed since the last adjustment
+        self._batches = 0
+        self._full_batches = 0
+        self._items = 0
+        self._busy_time = 0.
+        # Throughput measured with the previous batch size
+        self._prev_throughput = None
+        self._direction = 1
+        self.throughput = None
+        self.p99 = None
+
+        route.batch_size = min(
+            max(route.batch_size or max_batch_size, min_batch_size),
+            max_batch_size)
+        route.max_wait = min(route.max_wait, self.max_wait)
+
+    def _measure_p99(self):
+        latencies = sorted(self._latencies)
+        self._latencies.clear()
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1,
+                             math.ceil(len(latencies) * 0.99) - 1)]
+
+    def observe(self, batch, started_at, finished_at):
+        for request in batch:
+            self._latencies.append(finished_at - request.created_at)
+        self._batches += 1
+        self._items += len(batch)
+        self._busy_time += finished_at - started_at
+        if len(batch) >= self._route.batch_size:
+            self._full_batches += 1
+        if self._batches >= self._adjust_every:
+            self._adjust()
+
+    def _adjust(self):
+        route = self._route
+        # Batch size does not limit anything unless batches are full
+        saturated = self._full_batches * 2 >= self._batches
+        if self._busy_time > 0:
+            self.throughput = self._items / self._busy_time
+
+        self.p99 = self._measure_p99()
+
+        if self.target_p99 is not None:
+            if self.p99 > self.target_p99 and len(route) > route.batch_size:
+                # Requests are piling up in the queue, process them
+                # in bigger batches to keep up with the load
+                route.batch_size = min(
+                    self.max_batch_size, route.batch_size * 2)
+                route.max_wait = 0
+            elif self.p99 > self.target_p99:
+                route.batch_size = max(
+                    self.min_batch_size, route.batch_size // 2)
+                route.max_wait /= 2
+            elif self.p99 < self.target_p99 * 0.8 and saturated:
+                route.batch_size = min(
+                    self.max_batch_size, route.batch_size + 1)
+                route.max_wait = min(
+                    self.max_wait, route.max_wait + self.max_wait / 10)
+        elif not saturated:
+            # Let batches be filled up
+            route.max_wait = min(
+                self.max_wait, route.max_wait + self.max_wait / 10)
+        elif self.throughput is not None:
+            if self._prev_throughput is not None \
+                    and self.throughput < self._prev_throughput:
+                self._direction = -self._direction
+            self._prev_throughput = self.throughput
+            route.batch_size = min(
+                self.max_batch_size,
+                max(self.min_batch_size,
+                    route.batch_size + self._direction))
+
+        self._batches = 0
+        self._full_batches = 0
+        self._items = 0
+        self._busy_time = 0.
+
+    @property
+    def as_dict(self):
+        p99 = self.p99
+        return {
+            'min_batch_size': self.min_batch_size,
+            'max_batch_size': self.max_batch_size,
+            'target_p99_ms': (
+                self.target_p99 * 1000
+                if self.target_p99 is not None else None),
+            'p99_ms': p99 * 1000 if p99 is not None else None,
+            'throughput': self.throughput,
+        }
@@ -0,0 +1,253 @@
+import asyncio
+import functools
+import importlib.util
+import inspect
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from . import shared_memory
+from ..models import WrappaObject, stack_images
+
+
+def load_ds_model_class(config):
+    DSModel = config.get('model_class')
+    if not DSModel:
+        # Dynamically import package
+        spec = importlib.util.spec_from_file_location(
+            'DSModel', config['model_path'])
+        ds_lib = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(ds_lib)
+        DSModel = ds_lib.DSModel
+    return DSModel
+
+
+def load_ds_model(config):
+    # Init ds model
+    return load_ds_model_class(config)(**config['config'])
+
+
+def get_method(ds_model, method_name, is_json, images=None):
+    method = getattr(ds_model, method_name)
+    # Local variables of the method are not its arguments
+    parameters = inspect.signature(method).parameters
+    f_kwargs = {}
+    if 'as_json' in parameters:
+        f_kwargs['as_json'] = is_json or False
+    if images is not None and 'images' in parameters:
+        f_kwargs['images'] = images
+    return method, f_kwargs
+
+
+def has_images_argument(ds_model, method_name):
+    """Checks if method asks for images of the batch stacked in one
+    ndarray"""
+    method = getattr(ds_model, method_name)
+    return 'images' in inspect.signature(method).parameters
+
+
+def stack_batch_images(data, batch_decode):
+    """Stacks images of the batch in one ndarray, returns None unless
+    every object has an image"""
+    if not all(isinstance(x, WrappaObject) and x.image is not None
+               for x in data):
+        return None
+    return stack_images([x.image for x in data], **batch_decode)
+
+
+class InlineExecutor:
+    """Calls DSModel methods right on the event loop"""
+
+    concurrency = 1
+    _executor = None
+    _stage_executor = None
+
+    def __init__(self, ds_model, batch_decode=None):
+        self._ds_model = ds_model
+        self._batch_decode = batch_decode
+
+    def has_method(self, method_name):
+        return hasattr(self._ds_model, method_name)
+
+    async def _call(self, executor, func, *args):
+        return func(*args)
+
+    async def _run(self, executor, method_name, data, is_json, images=None):
+        method, f_kwargs = get_method(
+            self._ds_model, method_name, is_json, images)
+        if asyncio.iscoroutinefunction(method):
+            return await method(data, **f_kwargs)
+        return await self._call(
+            executor, functools.partial(method, data, **f_kwargs))
+
+    def stacks_images(self, method_name):
+        """Checks if images are stacked by stack_images before the
+        method is run"""
+        return self._batch_decode is not None \
+            and has_images_argument(self._ds_model, method_name)
+
+    async def stack_images(self, data):
+        """Stacks images of the batch outside of inference stage"""
+        return await self._call(
+            self._stage_executor, stack_batch_images, data, self._batch_decode)
+
+    async def run(self, method_name, data, is_json, images=None):
+        """Runs inference stage, images are passed to images argument"""
+        return await self._run(None, method_name, data, is_json, images)
+
+    async def call(self, func, *args):
+        """Calls func where DSModel.predict is called, e.g. to get next
+        item of a generator returned by DSModel"""
+        return await self._call(self._executor, func, *args)
+
+    async def run_stage(self, method_name, data, is_json):
+        """Runs pre- or post-processing stage"""
+        return await self._run(None, method_name, data, is_json)
+
+    def close(self):
+        pass
+
+
+class ThreadExecutor(InlineExecutor):
+    """Calls DSModel methods in a thread pool, so event loop keeps
+    accepting and parsing requests while a batch is processed.
+    Pre- and post-processing stages have their own thread pool
+    to overlap with inference.
+
+    DSModel is created in the pool as well, so models bound to the thread
+    they are created in (e.g. TF1 graphs) work with the dedicated thread.
+    """
+
+    def __init__(self, config, workers=1):
+        self.concurrency = workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='wrappa-model')
+        self._stage_executor = ThreadPoolExecutor(
+            max_workers=workers * 2, thread_name_prefix='wrappa-stage')
+        super().__init__(
+            self._executor.submit(load_ds_model, config).result(),
+            config.get('batch_decode'))
+
+    async def _call(self, executor, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+    async def run(self, method_name, data, is_json, images=None):
+        return await self._run(
+            self._executor, method_name, data, is_json, images)
+
+    async def run_stage(self, method_name, data, is_json):
+        return await self._run(
+            self._stage_executor, method_name, data, is_json)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._stage_executor.shutdown(wait=False)
+
+
+# DSModel instance of a worker process and its batch_decode config
+_worker_ds_model = None
+_worker_batch_decode = None
+
+
+def _init_worker(config):
+    global _worker_ds_model, _worker_batch_decode
+    _worker_ds_model = load_ds_model(config)
+    _worker_batch_decode = config.get('batch_decode')
+
+
+def _call_in_worker(method_name, data, is_json):
+    images = None
+    if _worker_batch_decode is not None \
+            and has_images_argument(_worker_ds_model, method_name):
+        images = stack_batch_images(data, _worker_batch_decode)
+    method, f_kwargs = get_method(
+        _worker_ds_model, method_name, is_json, images)
+    if asyncio.iscoroutinefunction(method):
+        res = asyncio.run(method(data, **f_kwargs))
+    else:
+        res = method(data, **f_kwargs)
+    res, blocks = shared_memory.pack(res)
+    # Blocks are unlinked by the parent once it has read the result
+    shared_memory.close(blocks)
+    return res
+
+
+def _run_in_worker(method_name, packed, is_json):
+    # Payloads are views of blocks created by the parent, so they are
+    # not copied, the blocks are kept open until the method returns
+    blocks = []
+    try:
+        return _call_in_worker(
+            method_name, shared_memory.unpack(packed, blocks=blocks),
+            is_json)
+    finally:
+        del packed
+        shared_memory.close(blocks)
+
+
+class ProcessExecutor:
+    """Runs DSModel in several worker processes, each of them holding its
+    own DSModel instance. Payloads are passed through shared memory.
+    Pre- and post-processing stages are run by the same workers, each of
+    them is a separate call, so output of every stage is sent back to the
+    server process and then to a worker again: hooks add a round trip
+    of the batch per stage. Images are stacked by the worker running the
+    method, so stacked arrays do not travel between processes."""
+
+    def __init__(self, config, workers):
+        shared_memory.ensure_resource_tracker()
+        self.concurrency = workers
+        # Model is instantiated by workers only
+        self._ds_model_class = load_ds_model_class(config)
+        # Workers are started by a fork server, as forking the server
+        # process with its running threads may deadlock them
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=_init_worker,
+            initargs=(config,),
+        )
+
+    def has_method(self, method_name):
+        return hasattr(self._ds_model_class, method_name)
+
+    def stacks_images(self, method_name):
+        return False
+
+    async def run(self, method_name, data, is_json, images=None):
+        loop = asyncio.get_event_loop()
+        packed, blocks = shared_memory.pack(data)
+        try:
+            res = await loop.run_in_executor(
+                self._executor,
+                _run_in_worker, method_name, packed, is_json)
+        finally:
+            shared_memory.release(blocks)
+        return shared_memory.unpack(res, unlink=True)
+
+    run_stage = run
+
+    async def call(self, func, *args):
+        """Calls func in this process. Generators can't be sent from
+        workers, so iterators returned by DSModel are already here"""
+        return func(*args)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def create_executor(config):
+    executor = config.get('executor', 'thread')
+    workers = config.get('executor_workers', os.cpu_count() or 1)
+    if executor == 'process':
+        return ProcessExecutor(config, workers)
+    if executor == 'loop':
+        return InlineExecutor(
+            load_ds_model(config), config.get('batch_decode'))
+    if executor == 'thread':
+        # Dedicated inference thread
+        return ThreadExecutor(config, 1)
+    if executor == 'thread_pool':
+        return ThreadExecutor(config, workers)
+    raise ValueError('Unknown executor: {}'.format(executor))
@@ -0,0 +1,283 @@
+import asyncio
+import datetime
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from .tasks import RenderedResult, ResultBody
+
+# Min time (in seconds) between removals of expired GridFS files
+SWEEP_INTERVAL = 60
+
+
+class GridFSBody:
+    """Body of rendered response stored in GridFS, it's read chunk by
+    chunk while it's sent"""
+
+    def __init__(self, store, file_id, size):
+        self._store = store
+        self._file_id = file_id
+        self.size = size
+
+    async def iter_chunks(self):
+        grid_out = await self._store.bucket.open_download_stream(
+            self._file_id)
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    async def send(self, response):
+        async for chunk in self.iter_chunks():
+            await response.write(chunk)
+
+    def close(self):
+        # File is not needed once the result is claimed and sent
+        self._store.delete_file(self._file_id)
+
+
+class MongoTaskStore:
+    """Async tasks shared by all replicas through MongoDB.
+
+    Tasks run on replica they are sent to, once they are done their
+    results are stored in collection, or in GridFS bucket if they are
+    larger than inline_size, so any replica can send them. Unclaimed
+    results expire ttl seconds after they are done, as well as tasks
+    lost with replica running them.
+    """
+
+    def __init__(self, db, ttl=3600, collection='async_tasks',
+                 bucket='async_results', inline_size=1024 ** 2,
+                 poll_interval=0.5, spill_size=1024 ** 2, spool_dir=None):
+        self._db = db
+        self._collection = db[collection]
+        self._bucket_name = bucket
+        self._bucket = None
+        self.ttl = ttl
+        self.inline_size = inline_size
+        # Time (in seconds) between checks of tasks run by other replicas
+        self.poll_interval = poll_interval
+        self._result_body = {'spill_size': spill_size, 'spool_dir': spool_dir}
+        self.pending = 0
+        # Tasks run by this replica until their results are stored
+        self._local = {}
+        self._cleanups = set()
+        self._indexes_created = False
+        self._swept_at = None
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(
+                self._db, bucket_name=self._bucket_name)
+        return self._bucket
+
+    async def _create_indexes(self):
+        if self._indexes_created:
+            return
+        await self._collection.create_index(
+            'expires_at', expireAfterSeconds=0)
+        await self._db['{}.files'.format(self._bucket_name)].create_index(
+            'metadata.expires_at')
+        self._indexes_created = True
+
+    def _expires_at(self):
+        return datetime.datetime.utcnow() + datetime.timedelta(
+            seconds=self.ttl)
+
+    def add(self, task_id, task, token=None):
+        self.pending += 1
+        self._local[task_id] = asyncio.ensure_future(
+            self._store(task_id, task, token))
+
+    async def _store(self, task_id, task, token):
+        try:
+            try:
+                await self._create_indexes()
+                await self._collection.insert_one({
+                    '_id': task_id,
+                    'status': 'pending',
+                    'token': token,
+                    'expires_at': self._expires_at(),
+                })
+            except Exception as e:
+                # Task is still run and known to this replica, its
+                # document is written once it's done
+                self._print_error(task_id, e)
+            await self._keep_alive(task_id, task)
+            try:
+                rendered = await task
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                doc = {'status': 'failed', 'expires_at': self._expires_at()}
+            else:
+                if rendered is None:
+                    # Result is delivered, there is nothing to keep
+                    await self._collection.delete_one({'_id': task_id})
+                    return
+                try:
+                    doc = await self._store_result(rendered)
+                finally:
+                    rendered.close()
+            # Pending document may be missing if it failed to be inserted
+            doc['token'] = token
+            await self._collection.update_one(
+                {'_id': task_id}, {'$set': doc}, upsert=True)
+            await self._sweep()
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        except Exception as e:
+            self._print_error(task_id, e)
+        finally:
+            self.pending -= 1
+            del self._local[task_id]
+
+    async def _keep_alive(self, task_id, task):
+        """Waits for the task and pushes back expiry of its pending
+        document, so it's not removed by TTL index while the task runs"""
+        while True:
+            done, _ = await asyncio.wait([task], timeout=self.ttl / 2)
+            if done:
+                return
+            try:
+                await self._collection.update_one(
+                    {'_id': task_id, 'status': 'pending'},
+                    {'$set': {'expires_at': self._expires_at()}})
+            except Exception as e:
+                self._print_error(task_id, e)
+
+    @staticmethod
+    def _print_error(task_id, e):
+        print(
+            'Failed to store async task {task_id}: {error!r}'.format(
+                task_id=task_id, error=e),
+            file=sys.stderr)
+
+    async def _store_result(self, rendered):
+        expires_at = self._expires_at()
+        doc = {
+            'status': 'done',
+            'code': rendered.status,
+            'headers': rendered.headers,
+            'size': rendered.body.size,
+            'expires_at': expires_at,
+        }
+        if rendered.body.size <= self.inline_size:
+            chunks = [chunk async for chunk in rendered.body.iter_chunks()]
+            doc['body'] = b''.join(chunks)
+            return doc
+        grid_in = self.bucket.open_upload_stream(
+            'result', metadata={'expires_at': expires_at})
+        try:
+            async for chunk in rendered.body.iter_chunks():
+                await grid_in.write(chunk)
+            await grid_in.close()
+        except:
+            await grid_in.abort()
+            raise
+        doc['file_id'] = grid_in._id
+        return doc
+
+    async def _sweep(self):
+        """Removes GridFS files of unclaimed results, they are not
+        removed by TTL index along with tasks"""
+        now = asyncio.get_event_loop().time()
+        if self._swept_at is not None \
+                and now - self._swept_at < SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        expired = self.bucket.find(
+            {'metadata.expires_at': {'$lt': datetime.datetime.utcnow()}})
+        async for grid_out in expired:
+            self.delete_file(grid_out._id)
+
+    def delete_file(self, file_id):
+        cleanup = asyncio.ensure_future(self._delete_file(file_id))
+        self._cleanups.add(cleanup)
+        cleanup.add_done_callback(self._cleanups.discard)
+
+    async def _delete_file(self, file_id):
+        try:
+            await self.bucket.delete(file_id)
+        except Exception:
+            # File is removed by another replica
+            pass
+
+    def _alive(self):
+        return {'expires_at': {'$gt': datetime.datetime.utcnow()}}
+
+    async def status(self, task_ids):
+        """Statuses of tasks: pending, done, failed or not_found"""
+        statuses = {x: 'pending' for x in task_ids if x in self._local}
+        other = [x for x in task_ids if x not in statuses]
+        if other:
+            docs = self._collection.find(
+                dict(self._alive(), _id={'$in': other}), {'status': 1})
+            async for doc in docs:
+                statuses[doc['_id']] = doc['status']
+        return {x: statuses.get(x, 'not_found') for x in task_ids}
+
+    async def wait(self, task_ids, timeout):
+        """Waits until at least one of tasks is done, tasks run by other
+        replicas are checked every poll_interval seconds"""
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + (timeout or 0)
+        while True:
+            statuses = await self.status(task_ids)
+            if any(x != 'pending' for x in statuses.values()):
+                return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            local = [self._local[x] for x in task_ids if x in self._local]
+            if len(local) < len(task_ids):
+                remaining = min(remaining, self.poll_interval)
+            if local:
+                await asyncio.wait(
+                    local, timeout=remaining,
+                    return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(remaining)
+
+    async def claim(self, task_id):
+        """Returns status of task along with its RenderedResult and token.
+        Finished task is removed, so it's claimed by one replica only.
+        The result has to be closed by the caller"""
+        if task_id in self._local:
+            return 'pending', None, None
+        doc = await self._collection.find_one_and_delete(
+            dict(self._alive(), _id=task_id,
+                 status={'$in': ['done', 'failed']}))
+        if doc is None:
+            doc = await self._collection.find_one(
+                dict(self._alive(), _id=task_id), {'status': 1})
+            return ('not_found' if doc is None else doc['status']), \
+                None, None
+        if doc['status'] == 'failed':
+            return 'failed', None, doc.get('token')
+        if 'file_id' in doc:
+            body = GridFSBody(self, doc['file_id'], doc['size'])
+        else:
+            body = ResultBody(**self._result_body)
+            await body.write(doc['body'])
+        rendered = RenderedResult(doc['code'], doc['headers'], body)
+        return 'done', rendered, doc.get('token')
+
+    async def close(self):
+        # Pending tasks are left in collection to expire
+        stores = list(self._local.values())
+        for store in stores:
+            store.cancel()
+        await asyncio.gather(*stores, return_exceptions=True)
+        if self._cleanups:
+            await asyncio.wait(list(self._cleanups))
+
+    @property
+    def as_dict(self):
+        return {
+            'backend': 'mongo',
+            'pending': self.pending,
+        }
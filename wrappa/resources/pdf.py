@@ -0,0 +1,108 @@
+import asyncio
+import collections
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+
+from ..models import WrappaImage
+
+
+def _count_pages(payload):
+    return pdfinfo_from_bytes(payload)['Pages']
+
+
+def _render_pages(payload, first_page, last_page, dpi, grayscale):
+    images = convert_from_bytes(
+        payload, dpi=dpi, first_page=first_page, last_page=last_page,
+        fmt='ppm', grayscale=grayscale)
+    return [np.asarray(image) for image in images]
+
+
+class PdfRasterizer:
+    """Renders pages of pdf files into WrappaImages.
+
+    Pages are rendered by poppler processes chunk by chunk, so neither
+    the event loop nor the other requests wait for a big pdf. At most
+    prefetch_chunks chunks of a file are rendered at once. All pages of
+    a file are collected before the request is queued, so they are
+    encoded to fmt right after rendering, unless as_arrays is set for
+    models reading as_ndarray only, then they are kept as rendered,
+    which takes ~12 Mb per A4 page at 200 dpi.
+    """
+
+    def __init__(self, dpi=200, first_page=1, last_page=None,
+                 max_pages=None, fmt='jpeg', grayscale=False,
+                 pages_per_task=4, prefetch_chunks=2, as_arrays=False,
+                 workers=None):
+        self.dpi = dpi
+        self.first_page = first_page
+        self.last_page = last_page
+        self.max_pages = max_pages
+        self.fmt = fmt
+        self.grayscale = grayscale
+        self.pages_per_task = pages_per_task
+        self.prefetch_chunks = prefetch_chunks
+        self.as_arrays = as_arrays
+        # Threads only wait for poppler processes doing the work
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1,
+            thread_name_prefix='wrappa-pdf')
+
+    def _page_range(self, pages_count):
+        last_page = pages_count
+        if self.last_page is not None:
+            last_page = min(last_page, self.last_page)
+        if self.max_pages is not None:
+            last_page = min(last_page, self.first_page + self.max_pages - 1)
+        return self.first_page, last_page
+
+    def _render_chunk(self, payload, name, first, last):
+        pages = _render_pages(payload, first, last, self.dpi, self.grayscale)
+        return [
+            WrappaImage.init_from_ndarray(
+                payload=page,
+                ext=self.fmt,
+                name='{}-{}.{}'.format(
+                    name, first - self.first_page + i, self.fmt),
+                lazy=self.as_arrays,
+            )
+            for i, page in enumerate(pages)
+        ]
+
+    async def iter_pages(self, payload, filename):
+        """Yields pages in order as soon as they are rendered"""
+        loop = asyncio.get_event_loop()
+        pages_count = await loop.run_in_executor(
+            self._executor, _count_pages, payload)
+        first_page, last_page = self._page_range(pages_count)
+        name = filename.split('.')[0]
+
+        def render(first):
+            return loop.run_in_executor(
+                self._executor, self._render_chunk, payload, name, first,
+                min(first + self.pages_per_task - 1, last_page))
+
+        starts = iter(range(first_page, last_page + 1, self.pages_per_task))
+        tasks = collections.deque(
+            render(first)
+            for first in itertools.islice(starts, self.prefetch_chunks))
+        try:
+            while tasks:
+                pages = await tasks.popleft()
+                for first in itertools.islice(starts, 1):
+                    tasks.append(render(first))
+                for page in pages:
+                    yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def rasterize(self, payload, filename):
+        """Returns all pages of the file in order"""
+        return [page async for page in self.iter_pages(payload, filename)]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -1,89 +1,212 @@
 import asyncio
-import datetime
-import io
-import json
+import mmap
 import uuid
 
 from PIL import Image
-from aiohttp import web, MultipartWriter, ClientSession
+from aiohttp import web
 from aiohttp.web_exceptions import HTTPRequestEntityTooLarge
-from pdf2image import convert_from_bytes
 
+from .admission import AdmissionController
+from .pdf import PdfRasterizer
 from .predictor import Predictor
+from .spooling import SpooledPart
+from .streaming import MultipartStream
+from .mongo_tasks import MongoTaskStore
+from .tasks import RenderedResult, ResultBody, TaskStore
+from .usage import UsageStats
+from .webhooks import Webhooks
 from ..common import *
-from ..models import WrappaFile, WrappaText, WrappaImage, WrappaObject
+from ..models import WrappaFile, WrappaText, WrappaImage, WrappaObject, \
+    WrappaTensor, encode_pending
+from ..models.tensor import DTYPE_HEADER, SHAPE_HEADER, parse_shape
 
 
 class Predict:
-    def __init__(self, db=None, **kwargs):
+    def __init__(self, db=None, http_client=None, **kwargs):
         self._db = db
+        self._http_client = http_client or HTTPClient()
         self._server_info = kwargs['server_info']
         self._predictor = Predictor.create(kwargs['ds_model_config'])
         self._storage = kwargs.get('storage')
         self._is_inited = False
-        self._tasks = dict()
+        # Serializer of JSON responses and errors
+        self._serializer = JSONSerializer(**kwargs.get('json', {}))
+        # Default options of images encoding by format
+        self._encode_options = kwargs.get('encoding', {})
+        limits = kwargs.get('limits', {})
+        # Default time (in seconds) client waits for the result
+        self._request_timeout = limits.get('request_timeout')
+        # Max size of request body kept in memory, the rest goes to disk
+        self._max_request_memory = limits.get(
+            'max_request_memory', 1024 ** 2 * 16)
+        self._spool_dir = limits.get('spool_dir')
+        self._admission = AdmissionController(
+            max_queue_size=limits.get('max_queue_size'),
+            max_inflight_bytes=limits.get('max_inflight_bytes'),
+            max_async_tasks=limits.get('max_async_tasks'),
+            retry_after=limits.get('retry_after', 1),
+        )
+        self._pdf = PdfRasterizer(**kwargs.get('pdf', {}))
+        self._usage = None
+        if db:
+            self._usage = UsageStats(db, **kwargs.get('usage_stats', {}))
+        async_tasks = kwargs.get('async_tasks', {})
+        # Rendered results over spill_size are kept on disk
+        self._result_body = {
+            'spill_size': async_tasks.get('spill_size', 1024 ** 2),
+            'spool_dir': async_tasks.get('spool_dir', self._spool_dir),
+        }
+        backend = async_tasks.get('backend', 'memory')
+        if backend == 'memory':
+            self._tasks = TaskStore(
+                ttl=async_tasks.get('ttl', 3600),
+                max_tasks=limits.get('max_async_tasks'),
+                max_size=async_tasks.get('max_size'),
+            )
+        elif backend == 'mongo':
+            if db is None:
+                raise ValueError('Set db to store async tasks in MongoDB')
+            mongo = dict(async_tasks.get('mongo', {}))
+            database = mongo.pop('database', 'wrappa')
+            self._tasks = MongoTaskStore(
+                db[database], ttl=async_tasks.get('ttl', 3600),
+                **mongo, **self._result_body)
+        else:
+            raise ValueError(
+                'Unknown async tasks backend: {}'.format(backend))
+        self._webhooks = Webhooks(
+            self._http_client, **kwargs.get('webhooks', {}))
+        # Max time (in seconds) client may wait for async task to be done
+        self._max_wait = async_tasks.get('max_wait', 60)
 
     async def _init(self):
         if not self._is_inited:
             self._predictor = await self._predictor
             self._is_inited = True
 
+    async def close(self):
+        self._pdf.close()
+        await self._tasks.close()
+        if self._is_inited:
+            await self._predictor.close()
+        else:
+            # DSModel has not been created, close its creation coroutine
+            self._predictor.close()
+        if self._usage is not None:
+            await self._usage.close()
+
     @staticmethod
-    async def _parse_file_object(args, key):
-        filename, buf = None, None
-        data = None
+    def _parse_payload(payload, filename, content_type, headers=None):
+        """Checks what payload is and wraps it in wrappa objects.
+        Returns None if image payload is not an image, e.g. it's a pdf"""
+        ext = filename.split('.')[-1]
+        if content_type == 'tensor':
+            headers = headers or {}
+            if headers.get(DTYPE_HEADER) is None:
+                tensor = WrappaTensor(payload=payload, name=filename)
+            else:
+                # Raw data of the tensor
+                tensor = WrappaTensor(
+                    buffer=payload, name=filename,
+                    dtype=headers[DTYPE_HEADER],
+                    shape=parse_shape(headers.get(SHAPE_HEADER, '-1')))
+            # Fail on malformed tensor while parsing request
+            _ = tensor.as_ndarray
+            return [tensor]
+        if content_type == 'image':
+            try:
+                _ = Image.open(BufferReader(payload))
+            except:
+                return None
+            return [WrappaImage(payload=payload, ext=ext, name=filename)]
+        return [WrappaFile(payload=payload, ext=ext, name=filename)]
+
+    async def _parse_file(self, payload, filename, content_type,
+                          headers=None):
+        loop = asyncio.get_event_loop()
+        parsed = await loop.run_in_executor(
+            None, self._parse_payload, payload, filename, content_type,
+            headers)
+        if parsed is None:
+            parsed = await self._pdf.rasterize(payload, filename)
+        return parsed
+
+    async def _parse_file_object(self, args, key):
+        content_type = key.split('-')[0]
         if args.get(key) is not None:
-            f = args[key].file
-            buf = io.BytesIO()
-            buf.write(f.read())
-            buf.flush()
-            f.close()
-            filename = args[key].filename
+            # Part has been parsed while the rest of the body was read
+            return await args[key]
         if args.get('{}_url'.format(key)) is not None:
             obj_url = args['{key}_url'.format(key=key)]
             # Download file
-            with ClientSession() as session:
-                async with session.get(obj_url) as resp:
-                    data = await resp.content()
-                    buf = io.BytesIO()
-                    buf.write(data)
-                    buf.flush()
+            data = await self._http_client.download(obj_url)
 
             tmp = obj_url.split('/')[-1].split('?')
             if len(tmp) <= 1:
                 filename = ''.join(tmp)
             else:
                 filename = ''.join(tmp[:-1])
-        content_type = key.split('-')[0]
-        ext = filename.split('.')[-1]
-        if filename is not None and buf is not None:
-            if content_type == 'image':
+            return await self._parse_file(data, filename, content_type)
+        raise ValueError('Missing {key}'.format(key=key))
+
+    async def _read_multipart(self, request):
+        """Reads multipart body part by part. Parts are kept in memory
+        until max_request_memory is exhausted, the rest is spooled to disk.
+        Files are parsed as soon as they are read, while the rest of
+        the body is still being uploaded."""
+        reader = await request.multipart()
+        max_size = request.client_max_size
+        memory_left = self._max_request_memory
+        fields = {}
+        size = 0
+        try:
+            while True:
+                part = await reader.next()
+                if part is None:
+                    break
+                if part.filename is None:
+                    value = await part.read(decode=True)
+                    size += len(value)
+                    if 0 < max_size < size:
+                        raise HTTPRequestEntityTooLarge(max_size, size)
+                    fields[part.name] = value.decode(
+                        part.get_charset(default='utf-8'))
+                    continue
+
+                spooled = SpooledPart(
+                    part.name, part.filename,
+                    max_memory_size=max(memory_left, 0),
+                    spool_dir=self._spool_dir)
                 try:
-                    buf.seek(0)
-                    _ = Image.open(buf)
-                    return [WrappaImage(
-                        payload=buf.getvalue(), ext=ext, name=filename)]
-                except:
-                    imgs = convert_from_bytes(buf.getvalue())
-                    for i, img in enumerate(imgs):
-                        buf = io.BytesIO()
-                        img.save(buf, format='JPEG')
-                        buf.flush()
-                        imgs[i] = WrappaImage(
-                            payload=buf.getvalue(),
-                            ext='jpeg',
-                            name='{}-{}.jpeg'.format(
-                                filename.split('.')[0], str(i)
-                            )
-                        )
-                    return imgs
-            data = {
-                'payload': buf.getvalue(),
-                'ext': ext,
-                'name': filename
-            }
-
-        return [WrappaFile(**data)]
+                    while True:
+                        chunk = await part.read_chunk()
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if 0 < max_size < size:
+                            raise HTTPRequestEntityTooLarge(max_size, size)
+                        spooled.write(part.decode(chunk))
+                finally:
+                    if spooled.in_memory:
+                        memory_left -= spooled.size
+                    payload = spooled.getbuffer()
+                fields[part.name] = asyncio.ensure_future(self._parse_file(
+                    payload, part.filename, part.name.split('-')[0],
+                    part.headers))
+        except:
+            self._discard_fields(fields)
+            raise
+        return fields
+
+    @staticmethod
+    def _discard_fields(fields):
+        for value in fields.values():
+            if isinstance(value, asyncio.Future):
+                if value.done():
+                    # Mark exception as retrieved
+                    value.exception()
+                else:
+                    value.cancel()
 
     @staticmethod
     def _parse_text(args, key):
@@ -107,13 +230,25 @@ class Predict:
 
     async def _parse_one_request(self, data, key=None):
         input_spec = self._server_info['specification']['input']
-        imgs, files, texts = [None], [None], [None]
+        imgs, files, tensors, texts = [None], [None], [None], [None]
+        # Files may be downloaded, so they are fetched concurrently
+        fetches = []
         if 'image' in input_spec:
             k = 'image' if key is None else 'image-{}'.format(key)
-            imgs = await self._parse_file_object(data, k)
+            fetches.append(self._parse_file_object(data, k))
         if 'file' in input_spec:
             k = 'file' if key is None else 'file-{}'.format(key)
-            files = await self._parse_file_object(data, k)
+            fetches.append(self._parse_file_object(data, k))
+        if 'tensor' in input_spec:
+            k = 'tensor' if key is None else 'tensor-{}'.format(key)
+            fetches.append(self._parse_file_object(data, k))
+        fetched = await asyncio.gather(*fetches)
+        if 'image' in input_spec:
+            imgs = fetched.pop(0)
+        if 'file' in input_spec:
+            files = fetched.pop(0)
+        if 'tensor' in input_spec:
+            tensors = fetched.pop(0)
         if 'text' in input_spec:
             k = 'text' if key is None else 'text-{}'.format(key)
             texts = self._parse_text(data, k)
@@ -121,32 +256,48 @@ class Predict:
         resp = []
         for i in imgs:
             for f in files:
-                for t in texts:
-                    r = WrappaObject()
-                    if i:
-                        r.set_value(i)
-                    if f:
-                        r.set_value(f)
-                    if t:
-                        r.set_value(t)
-                    resp.append(r)
+                for tensor in tensors:
+                    for t in texts:
+                        r = WrappaObject()
+                        if i:
+                            r.set_value(i)
+                        if f:
+                            r.set_value(f)
+                        if tensor:
+                            r.set_value(tensor)
+                        if t:
+                            r.set_value(t)
+                        resp.append(r)
         if 'list' not in input_spec and len(resp) == 1:
             return resp[0]
         return resp
 
     async def _parse_request(self, request):
-        data = await request.post()
+        if request.content_type == 'multipart/form-data':
+            data = await self._read_multipart(request)
+        else:
+            data = await request.post()
 
         input_spec = self._server_info['specification']['input']
-        if 'list' in input_spec:
-            if not data:
-                return []
-            resp = []
-            max_ind = max(map(lambda x: int(x.split('-')[-1]), data.keys()))
-            for i in range(max_ind + 1):
-                resp.extend(await self._parse_one_request(data, i))
-        else:
-            resp = await self._parse_one_request(data)
+        try:
+            if 'list' in input_spec:
+                if not data:
+                    return []
+                resp = []
+                # Keys look like image-1 or image-1_url
+                max_ind = max(map(
+                    lambda x: int(x.split('-')[-1].split('_')[0]),
+                    data.keys()))
+                parsed = await asyncio.gather(*[
+                    self._parse_one_request(data, i)
+                    for i in range(max_ind + 1)
+                ])
+                for r in parsed:
+                    resp.extend(r)
+            else:
+                resp = await self._parse_one_request(data)
+        finally:
+            self._discard_fields(data)
 
         return resp
 
@@ -161,12 +312,16 @@ class Predict:
 
         return None
 
-    def _prepare_json_response(self, data):
-        return web.json_response(
-            data=data,
-            status=200,
-            dumps=functools.partial(json.dumps, indent=4, ensure_ascii=False)
-        )
+    def _error(self, error, headers=None):
+        """JSON response of error class rendered by the serializer
+        of the server"""
+        return error.json_response(headers, self._serializer)
+
+    async def _prepare_json_response(self, request, data):
+        if request is None:
+            # Response is rendered in advance
+            return self._serializer.response(data)
+        return await self._serializer.write(request, data)
 
     @staticmethod
     def _add_fields_file_object_value(fields, value, key, index=None):
@@ -176,7 +331,7 @@ class Predict:
         payload = value['payload']
         filename = value['name']
         payload_type = type(payload)
-        if not isinstance(payload, bytes):
+        if not isinstance(payload, (bytes, bytearray, memoryview, mmap.mmap)):
             raise TypeError(
                 'Expecting type bytes for image.payload, got {payload_type}'.format(
                     payload_type=payload_type))
@@ -184,7 +339,8 @@ class Predict:
             raise TypeError(
                 'Wrong extension, expecting jpg, png or gif, got {ext}'.format(
                     ext=ext))
-        buf = io.BytesIO(payload)
+        # Payload is written as is, without copying it
+        buf = BufferPayload(payload)
         if index is not None:
             if key == 'image':
                 fields['{key}-{index}'.format(key=key, index=index)] = (
@@ -201,6 +357,21 @@ class Predict:
                     filename, buf, 'applications/octet-stream')
         return fields
 
+    @staticmethod
+    def _add_fields_tensor_value(fields, value, key, index=None):
+        if value is None:
+            return fields
+        if not isinstance(value, WrappaTensor):
+            raise TypeError(
+                'Expecting type WrappaTensor for tensor, got {t}'.format(
+                    t=type(value)))
+        if index is not None:
+            key = '{key}-{index}'.format(key=key, index=index)
+        # Raw data of the array is sent as is
+        fields[key] = (value.raw_name, BufferPayload(value.buffer),
+                       'application/octet-stream', value.headers)
+        return fields
+
     @staticmethod
     def _add_fields_text_value(fields, value, key, index=None):
         if value is None:
@@ -217,19 +388,15 @@ class Predict:
             fields[key] = value
         return fields
 
-    async def _prepare_form_data_response(self, request, data):
+    def _get_fields(self, data, index=None):
+        """Multipart fields of one WrappaObject"""
         output_spec = self._server_info['specification']['output']
         fields = {}
 
         for spec in ['image', 'file']:
             if spec in output_spec:
-                if 'list' in output_spec:
-                    for i, v in enumerate(data):
-                        fields = self._add_fields_file_object_value(
-                            fields, getattr(v, spec).as_dict, spec, index=i)
-                else:
-                    fields = self._add_fields_file_object_value(
-                        fields, getattr(data, spec).as_dict, spec)
+                fields = self._add_fields_file_object_value(
+                    fields, getattr(data, spec).as_dict, spec, index=index)
 
         for spec in ['image_url', 'file_url']:
             if spec in output_spec:
@@ -237,47 +404,138 @@ class Predict:
                     'file_url': 'file',
                     'image_url': 'image'
                 }[spec]
-                if 'list' in output_spec:
-                    for i, v in enumerate(data):
-                        fields = self._add_fields_text_value(
-                            fields, getattr(v, obj_type).url, spec, index=i)
-                else:
-                    fields = self._add_fields_text_value(
-                        fields, getattr(data, obj_type).url, spec)
+                fields = self._add_fields_text_value(
+                    fields, getattr(data, obj_type).url, spec, index=index)
+
+        if 'tensor' in output_spec:
+            fields = self._add_fields_tensor_value(
+                fields, data.tensor, 'tensor', index=index)
 
         if 'text' in output_spec:
-            if 'list' in output_spec:
-                for i, v in enumerate(data):
-                    fields = self._add_fields_text_value(
-                        fields, getattr(v, 'text').text, 'text', index=i)
+            fields = self._add_fields_text_value(
+                fields, getattr(data, 'text').text, 'text', index=index)
+        return fields
+
+    async def _encode_images(self, objs):
+        if 'image' not in self._server_info['specification']['output']:
+            return
+        # Images created with lazy=True are encoded in parallel
+        images = [obj.image for obj in objs
+                  if isinstance(obj, WrappaObject) and obj.image is not None]
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None, encode_pending, images, None, self._encode_options)
+
+    @staticmethod
+    async def _write_fields(stream, fields):
+        for k, value in fields.items():
+            if isinstance(value, tuple):
+                await stream.append(
+                    k, value[1], filename=value[0], content_type=value[2],
+                    headers=value[3] if len(value) > 3 else None)
             else:
-                fields = self._add_fields_text_value(
-                    fields, getattr(data, 'text').text, 'text')
-
-        with MultipartWriter('form-data') as mpwriter:
-            response = web.StreamResponse(
-                status=200,
-                headers={
-                    'Content-Type': 'multipart/form-data;boundary={}'.format(
-                        mpwriter.boundary),
-                }
-            )
-            await response.prepare(request)
-            for k, value in fields.items():
-                if isinstance(value, tuple):
-                    mpwriter.append(value[1], {
-                        'Content-Disposition': 'form-data; name="{name}"; filename="{filename}"'.format(
-                            name=k, filename=value[0]
-                        ),
-                        'Content-Type': value[2],
-                    })
-                else:
-                    mpwriter.append(value, {
-                        'Content-Disposition': 'form-data; name="{name}"'.format(
-                            name=k
-                        ),
-                    })
-            await mpwriter.write(response)
+                await stream.append(k, value)
+
+    async def _get_form_data_fields(self, data):
+        if 'list' in self._server_info['specification']['output']:
+            await self._encode_images(data)
+            fields = {}
+            for i, v in enumerate(data):
+                fields.update(self._get_fields(v, index=i))
+        else:
+            await self._encode_images([data])
+            fields = self._get_fields(data)
+        return fields
+
+    async def _prepare_form_data_response(self, request, data):
+        fields = await self._get_form_data_fields(data)
+        response = web.StreamResponse(status=200)
+        stream = MultipartStream(response)
+        response.headers['Content-Type'] = stream.content_type
+        await response.prepare(request)
+        await self._write_fields(stream, fields)
+        await stream.close()
+        return response
+
+    @staticmethod
+    def _stream_error():
+        print(
+            'Failed to stream response with exception\n{exception}'.format(
+                exception=traceback.format_exc()),
+            file=sys.stderr)
+        return {
+            'code': DSModelError.http_code,
+            'message': DSModelError.message,
+            'errno': DSModelError.errno,
+            'traceback': traceback.format_exc(),
+        }
+
+    async def _stream_form_data_response(self, request, items, collected):
+        """Sends every item of streamed result as soon as it is ready.
+        Failure of DSModel is sent as the last part named error."""
+        response = web.StreamResponse(status=200)
+        stream = MultipartStream(response)
+        response.headers['Content-Type'] = stream.content_type
+        await response.prepare(request)
+        index = 0
+        while True:
+            try:
+                item = await items.__anext__()
+                await self._encode_images([item])
+                fields = self._get_fields(item, index=index)
+            except StopAsyncIteration:
+                break
+            except Exception:
+                await stream.append(
+                    'error', self._serializer.dumpb(self._stream_error()),
+                    content_type='application/json')
+                break
+            await self._write_fields(stream, fields)
+            if collected is not None:
+                collected.append(item)
+            index += 1
+        await stream.close()
+        return response
+
+    async def _stream_json_response(self, request, items, collected):
+        """Sends every item of streamed result as a line of NDJSON as soon
+        as it is ready. Failure of DSModel is sent as the last line
+        {"error": {...}}."""
+        response = web.StreamResponse(
+            status=200, headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        serializer = self._serializer
+        while True:
+            try:
+                item = await items.__anext__()
+                line = serializer.dumpb_line(item)
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # Wrapped, so it's not mistaken for an item
+                await response.write(
+                    serializer.dumpb_line({'error': self._stream_error()}))
+                break
+            await response.write(line)
+            if collected is not None:
+                collected.append(item)
+        return response
+
+    async def _post_stream(self, request, res, response_type, token, data):
+        items = self._predictor.iterate(res)
+        # Streamed items are kept only if they have to be stored
+        collected = [] if self._storage is not None else None
+        try:
+            if response_type == 'multipart/form-data':
+                response = await self._stream_form_data_response(
+                    request, items, collected)
+            else:
+                response = await self._stream_json_response(
+                    request, items, collected)
+        finally:
+            await items.aclose()
+        if self._storage is not None:
+            self._storage.add(token, data, collected)
         return response
 
     async def _post_end(self, request, res, response_type, token, data):
@@ -291,6 +549,10 @@ class Predict:
                 file=sys.stderr)
             res = str(exception)
 
+        if self._predictor.is_stream(res):
+            return await self._post_stream(
+                request, res, response_type, token, data)
+
         if self._storage is not None:
             self._storage.add(token, data, res)
 
@@ -298,103 +560,248 @@ class Predict:
             try:
                 raise exception
             except:
-                return DSModelError.json_response()
+                return self._error(DSModelError)
 
         # Prepare and send response
         response = None
         if response_type == 'multipart/form-data':
             response = await self._prepare_form_data_response(request, res)
         elif response_type == 'application/json':
-            response = self._prepare_json_response(res)
+            response = await self._prepare_json_response(request, res)
 
         if response is None:
-            return UnableToPrepareResponseError.json_response()
+            return self._error(UnableToPrepareResponseError)
         return response
 
-    async def _inc_usage(self, token, label):
-        if not self._db:
-            return
-        now = datetime.datetime.utcnow()
-        ymd = int(now.strftime('%Y%m%d'))
-        ym = int(now.strftime('%Y%m'))
-        daily = self._db.usage_stats.daily
-        monthly = self._db.usage_stats.monthly
-        inc = {'$inc': {label: 1}}
-        await daily.update_one(
-            {'token': token, 'date': ymd}, inc, upsert=True)
-        await monthly.update_one(
-            {'token': token, 'date': ym}, inc, upsert=True)
-
-    @UnknownError.if_failed
-    async def post(self, request):
-        await self._init()
-        # Check authorization
-        authorized, token = self._check_auth(request)
-        if not authorized:
-            return UnauthorizedError.json_response()
-
-        await self._inc_usage(token, 'total')
-
+    async def _render_result(self, res, response_type, token, data):
+        """Renders result of async task, so neither inputs nor DSModel
+        output are kept until the client fetches it"""
+        if not isinstance(res, tuple) \
+                and response_type == 'multipart/form-data':
+            if self._storage is not None:
+                self._storage.add(token, data, res)
+            fields = await self._get_form_data_fields(res)
+            body = ResultBody(**self._result_body)
+            try:
+                stream = MultipartStream(body)
+                await self._write_fields(stream, fields)
+                await stream.close()
+            except:
+                body.close()
+                raise
+            return RenderedResult(
+                200, {'Content-Type': stream.content_type}, body)
+        # JSON responses and failures do not need request to be rendered
+        response = await self._post_end(
+            None, res, response_type, token, data)
+        return await RenderedResult.from_response(
+            response, **self._result_body)
+
+    def _inc_usage(self, token, label):
+        if self._usage is not None:
+            self._usage.inc(token, label)
+
+    def _overloaded_response(self):
+        return self._error(ServiceOverloadedError, headers={
+            'Retry-After': str(self._admission.retry_after),
+        })
+
+    def _get_timeout(self, request, is_async=False):
+        # Nobody waits on the connection for async task,
+        # so only timeout set by the client applies to it
+        timeout = None if is_async else self._request_timeout
+        header = request.headers.get('X-Request-Timeout')
+        if header is not None:
+            try:
+                header = float(header)
+            except ValueError:
+                header = None
+        if header is not None and header > 0:
+            timeout = header if timeout is None else min(timeout, header)
+        return timeout
+
+    def _get_wait(self, request):
+        """Time (in seconds) client is ready to wait for async tasks
+        passed in wait query parameter"""
+        try:
+            wait = float(request.query.get('wait', 0))
+        except ValueError:
+            wait = 0
+        return max(0, min(wait, self._max_wait))
+
+    async def _predict_async(self, data, is_json, path, token, deadline,
+                             response_type):
+        res = await self._predictor.predict(
+            data, is_json, path, token, deadline)
+        if self._predictor.is_stream(res):
+            # Result of async task is sent at once, so it's collected
+            items = self._predictor.iterate(res)
+            try:
+                res = [item async for item in items]
+            finally:
+                await items.aclose()
+        return await self._render_result(res, response_type, token, data)
+
+    async def _predict_request(self, request, token, is_async,
+                               callback_url=None):
+        """Returns response and async task if one was created"""
+        loop = asyncio.get_event_loop()
+        timeout = self._get_timeout(request, is_async)
+        deadline = loop.time() + timeout if timeout is not None else None
         # Parse request
         response_type = self._get_response_type(request)
         if response_type is None:
-            return InvalidAcceptHeaderValueError.json_response()
+            return self._error(InvalidAcceptHeaderValueError), None
         try:
             data = await self._parse_request(request)
         except HTTPRequestEntityTooLarge:
-            return HTTPRequestEntityTooLargeError.json_response()
+            return self._error(HTTPRequestEntityTooLargeError), None
         except Exception as e:
             print(
                 'Failed to parse request with exception\n{exception}'.format(
                     exception=traceback.format_exc()
                 ),
                 file=sys.stderr)
-            return UnbaleToParseRequestError.json_response()
+            return self._error(UnbaleToParseRequestError), None
         if data is None:
-            return ForbiddenError.json_response()
+            return self._error(ForbiddenError), None
         if data == WrappaObject() or (
                     isinstance(data, list) and (
                             not data or WrappaObject() in data)):
-            return InvalidDataError.json_response()
+            return self._error(InvalidDataError), None
         # Send data to request
         is_json = False
         if 'json' in self._server_info['specification']['output']:
             is_json = response_type == 'application/json'
 
-        is_async = request.query.get('async', 'false') == 'true'
-        task = self._predictor.predict(data, is_json, request.path)
-
         if not is_async:
-            res = await task
+            task = self._predictor.predict(
+                data, is_json, request.path, token, deadline,
+                request.transport)
+            try:
+                res = await asyncio.wait_for(
+                    task,
+                    deadline - loop.time() if deadline is not None else None)
+            except asyncio.TimeoutError:
+                return self._error(RequestTimeoutError), None
             result = await self._post_end(
                 request, res, response_type, token, data)
-            await self._inc_usage(token, 'success')
-            return result
+            self._inc_usage(token, 'success')
+            return result, None
 
         task_id = str(uuid.uuid4())
-        self._tasks[task_id] = (
-            asyncio.ensure_future(task), response_type, token, data
-        )
-        return web.json_response(
-            data={'task_id': task_id},
-            dumps=functools.partial(json.dumps, indent=4),
-        )
+        task = asyncio.ensure_future(self._predict_async(
+            data, is_json, request.path, token, deadline, response_type))
+        stored = task
+        if callback_url is not None:
+            # Inputs are released once prediction is done, while
+            # delivery may be retried for long
+            stored = asyncio.ensure_future(
+                self._deliver(task, callback_url, task_id, token))
+        self._tasks.add(task_id, stored, token)
+        return self._serializer.response({'task_id': task_id}), task
+
+    async def _deliver(self, task, url, task_id, token):
+        """Pushes result of async task to url. The result is kept to be
+        fetched only if it's not delivered, otherwise None is returned"""
+        try:
+            rendered = await task
+        except Exception:
+            failed = await RenderedResult.from_response(
+                self._error(AsyncTaskFailedError), **self._result_body)
+            try:
+                delivered = await self._webhooks.deliver(
+                    url, failed, {'X-Task-Id': task_id})
+            finally:
+                failed.close()
+            if delivered:
+                return None
+            raise
+        delivered = await self._webhooks.deliver(
+            url, rendered, {'X-Task-Id': task_id})
+        if not delivered:
+            return rendered
+        rendered.close()
+        self._inc_usage(token, 'success')
+        return None
+
+    @UnknownError.if_failed
+    async def post(self, request):
+        await self._init()
+        # Check authorization
+        authorized, token = self._check_auth(request)
+        if not authorized:
+            return self._error(UnauthorizedError)
+
+        self._inc_usage(token, 'total')
+
+        # Reject request before reading its body if server is overloaded
+        is_async = request.query.get('async', 'false') == 'true'
+        callback_url = request.query.get('callback_url')
+        if callback_url is not None and (
+                not is_async
+                or not self._webhooks.is_allowed_url(callback_url)):
+            return self._error(InvalidDataError)
+        if is_async and not self._admission.can_add_async_task(
+                self._tasks.pending):
+            return self._overloaded_response()
+        request_size = request.content_length or 0
+        if not self._admission.acquire(request_size):
+            return self._overloaded_response()
+        release = functools.partial(self._admission.release, request_size)
+
+        try:
+            response, task = await self._predict_request(
+                request, token, is_async, callback_url)
+        except:
+            release()
+            raise
+        if task is None:
+            release()
+        else:
+            task.add_done_callback(lambda _: release())
+        return response
 
     @UnknownError.if_failed
     async def result(self, request):
         task_id = request.match_info['task_id']
-        if task_id not in self._tasks:
-            return AsyncTaskNotFoundError.json_response()
-        task, response_type, token, data = self._tasks[task_id]
-        if not task.done():
-            return AsyncTaskNotDoneError.json_response()
+        await self._tasks.wait([task_id], self._get_wait(request))
+        status, rendered, token = await self._tasks.claim(task_id)
+        if status == 'not_found':
+            return self._error(AsyncTaskNotFoundError)
+        if status == 'pending':
+            return self._error(AsyncTaskNotDoneError)
+        if status == 'failed':
+            return self._error(AsyncTaskFailedError)
         try:
-            res = await task
-            result = await self._post_end(
-                request, res, response_type, token, data)
-            await self._inc_usage(token, 'success')
-            return result
-        except Exception as e:
-            return AsyncTaskFailedError.json_response()
+            response = await rendered.send(request)
         finally:
-            del self._tasks[task_id]
+            rendered.close()
+        self._inc_usage(token, 'success')
+        return response
+
+    @UnknownError.if_failed
+    async def status(self, request):
+        try:
+            task_ids = (await request.json())['task_ids']
+            assert isinstance(task_ids, list)
+            task_ids = [str(x) for x in task_ids]
+        except Exception:
+            return self._error(InvalidDataError)
+        await self._tasks.wait(task_ids, self._get_wait(request))
+        return self._serializer.response({
+            'tasks': await self._tasks.status(task_ids),
+        })
+
+    @UnknownError.if_failed
+    async def stats(self, request):
+        await self._init()
+        authorized, _ = self._check_auth(request)
+        if not authorized:
+            return self._error(UnauthorizedError)
+        stats = dict(self._predictor.stats)
+        stats['admission'] = self._admission.as_dict
+        stats['async_tasks'] = self._tasks.as_dict
+        if self._http_client.cache is not None:
+            stats['download_cache'] = self._http_client.cache.stats
+        return self._serializer.response(stats)
@@ -1,8 +1,11 @@
 import asyncio
-import importlib.util
 import traceback
+from collections.abc import AsyncIterator, Iterator
 
-from .requests_manager import RequestsManager
+from .batch_controller import AdaptiveBatchController
+from .executors import create_executor
+from .requests_manager import PendingRequest, RequestsManager, RouteQueue
+from .scheduling import SchedulingPolicy
 
 path2def_name = lambda path: path.strip('/').replace('/', '_')
 
@@ -11,93 +14,223 @@ class Predictor:
     @classmethod
     async def create(cls, config):
         self = cls(config)
-        self._queue = asyncio.Queue()
-        asyncio.ensure_future(self.start_pooling())
+        concurrency = self._executor.concurrency
+        # Each stage of the pipeline processes up to `concurrency` batches
+        # at the same time, so while one batch is in inference the next
+        # one is preprocessed and the previous one is postprocessed
+        self._stages = {
+            stage: asyncio.Semaphore(concurrency)
+            for stage in ('preprocess', 'predict', 'postprocess')
+        }
+        stages = 1 + self._has_preprocess + self._has_postprocess
+        # Number of batches of a route which may be in the pipeline
+        # at the same time, unless set explicitly for the route
+        self._concurrency = concurrency * stages
         return self
 
     def __init__(self, config):
-        DSModel = config.get('model_class')
-        if not DSModel:
-            # Dynamically import package
-            spec = importlib.util.spec_from_file_location(
-                'DSModel', config['model_path'])
-            ds_lib = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(ds_lib)
-            DSModel = ds_lib.DSModel
-        # Init ds model
-        self._ds_model = DSModel(**config['config'])
-        self._requests_manager = RequestsManager()
+        self._executor = create_executor(config)
+        self._has_preprocess = self._executor.has_method('preprocess')
+        self._has_postprocess = self._executor.has_method('postprocess')
+        self._requests_manager = RequestsManager(self._create_route)
         self._batch_size = config.get('batch_size', 4)
+        self._max_wait_ms = config.get('max_wait_ms', 5)
+        self._adaptive_batching = config.get('adaptive_batching')
+        self._policy = SchedulingPolicy(**config.get('scheduling', {}))
+        # Batching settings of separate routes
+        self._routes_config = {
+            path2def_name(path): route_config
+            for path, route_config in config.get('routes', {}).items()
+        }
         self._async = config.get('async', False)
+        # Tasks collecting batches of routes
+        self._pooling = []
+        # Tasks processing collected batches
+        self._batches = set()
 
-    def _need_to_process_batch(self) -> bool:
-        if self._queue.empty():
-            return True
-        request = self._queue.get_nowait()
-        self._requests_manager[request[-2:]].append(request[:-2])
-        bs = self._batch_size
-        tasks = sum(len(v) for v in self._requests_manager.values())
-        if bs and tasks >= bs:
-            return True
-        return False
-
-    async def start_pooling(self):
+    def _create_route(self, key):
+        predict_name, _ = key
+        route_config = self._routes_config.get(predict_name, {})
+        route = RouteQueue(
+            key,
+            batch_size=route_config.get('batch_size', self._batch_size),
+            max_wait=route_config.get(
+                'max_wait_ms', self._max_wait_ms) / 1000,
+            concurrency=route_config.get('concurrency', self._concurrency),
+            policy=self._policy,
+        )
+        adaptive_batching = route_config.get(
+            'adaptive_batching', self._adaptive_batching)
+        if adaptive_batching:
+            route.controller = AdaptiveBatchController(
+                route, **adaptive_batching)
+        self._pooling.append(asyncio.ensure_future(self.start_pooling(route)))
+        return route
+
+    @staticmethod
+    def _set_result(request, predict):
+        # Client may have gone away while the batch was processed
+        if not request.future.done():
+            request.future.set_result(predict)
+
+    @staticmethod
+    def _format_error(e, trace=None):
+        if trace is None:
+            trace = ''.join(traceback.format_exception(
+                type(e), e, e.__traceback__))
+        return e, trace
+
+    async def _process_batch(self, key, requests):
+        # Do not spend DSModel time on requests nobody waits for
+        alive = []
+        for x in requests:
+            if x.is_abandoned:
+                x.abandon()
+            else:
+                alive.append(x)
+        requests = alive
+        if not requests:
+            return
+
+        try:
+            predicts = await self._predict(
+                [x.data for x in requests],
+                key[1],
+                key[0]
+            )
+            if len(predicts) != len(requests):
+                raise ValueError(
+                    'DSModel returned {} results for {} inputs'.format(
+                        len(predicts), len(requests)))
+        except Exception as e:
+            if len(requests) == 1:
+                self._set_result(
+                    requests[0], self._format_error(e, traceback.format_exc()))
+                return
+            # Split the batch in halves to find out failing inputs,
+            # so one bad input costs O(log n) extra calls instead of n
+            middle = len(requests) // 2
+            await asyncio.gather(
+                self._process_batch(key, requests[:middle]),
+                self._process_batch(key, requests[middle:]),
+            )
+            return
+
+        for x, predict in zip(requests, predicts):
+            # DSModel may return an exception in place of a result
+            # to fail a single input without failing the whole batch
+            if isinstance(predict, Exception):
+                predict = self._format_error(predict)
+            self._set_result(x, predict)
+
+    async def _process_route_batch(self, route, batch):
+        loop = asyncio.get_event_loop()
+        started_at = loop.time()
+        try:
+            await self._process_batch(route.key, batch)
+        except asyncio.CancelledError:
+            # Predictor is closed, requests of the batch get no result
+            for x in batch:
+                if not x.future.done():
+                    x.future.cancel()
+            raise
+        finally:
+            route.slots.release()
+        if route.controller is not None:
+            route.controller.observe(batch, started_at, loop.time())
+
+    async def start_pooling(self, route):
         while True:
-            need_to_process_batch = self._need_to_process_batch()
-            if need_to_process_batch:
-                await asyncio.sleep(0.05)
-
-                for key, data in self._requests_manager.items():
-                    try:
-                        predicts = await self._predict(
-                            [x[1] for x in data],
-                            key[1],
-                            key[0]
-                        )
-                        for x, predict in zip(data, predicts):
-                            queue = x[0]
-                            queue.put_nowait(predict)
-                    except:
-                        for x in data:
-                            try:
-                                predict = await self._predict(
-                                    [x[1]],
-                                    key[1],
-                                    key[0]
-                                )
-                            except Exception as e:
-                                trace = traceback.format_exc()
-                                predict = e, trace
-                            queue = x[0]
-                            queue.put_nowait(predict)
-
-                self._requests_manager.clear()
+            # Wait for a free slot of the route, meanwhile requests are
+            # piling up in the queue and the next batch will be filled up
+            await route.slots.acquire()
+            batch = await route.collect_batch()
+            task = asyncio.ensure_future(
+                self._process_route_batch(route, batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def close(self):
+        for task in self._pooling:
+            task.cancel()
+        await asyncio.gather(*self._pooling, return_exceptions=True)
+        # Batches must not run on the executor after it is shut down
+        batches = list(self._batches)
+        for task in batches:
+            task.cancel()
+        await asyncio.gather(*batches, return_exceptions=True)
+        self._executor.close()
+
+    @property
+    def queue_size(self):
+        return self._requests_manager.total()
+
+    @property
+    def stats(self):
+        return {
+            'routes': [route.as_dict
+                       for route in self._requests_manager.values()],
+        }
+
+    @staticmethod
+    def is_stream(result):
+        """Checks if DSModel returned generator instead of a result"""
+        return isinstance(result, (Iterator, AsyncIterator))
+
+    async def iterate(self, result):
+        """Yields items of a generator returned by DSModel.
+        Synchronous generators are run where DSModel.predict is."""
+        if isinstance(result, AsyncIterator):
+            try:
+                async for item in result:
+                    yield item
+            finally:
+                if hasattr(result, 'aclose'):
+                    await result.aclose()
+            return
+        end = object()
+        try:
+            while True:
+                item = await self._executor.call(next, result, end)
+                if item is end:
+                    return
+                yield item
+        finally:
+            if hasattr(result, 'close'):
+                await self._executor.call(result.close)
 
     async def _predict(self, data, is_json: bool, predict_name: str):
-        predict_method = (
-            getattr(self._ds_model, predict_name)
-            if hasattr(self._ds_model, predict_name)
-            else self._ds_model.predict
-        )
-        f_kwargs = {}
-        if 'as_json' in predict_method.__code__.co_varnames:
-            f_kwargs['as_json'] = is_json or False
+        if not self._executor.has_method(predict_name):
+            predict_name = 'predict'
 
-        if asyncio.iscoroutinefunction(predict_method):
-            res = await predict_method(data, **f_kwargs)
-        else:
-            res = predict_method(data, **f_kwargs)
+        if self._has_preprocess:
+            async with self._stages['preprocess']:
+                data = await self._executor.run_stage(
+                    'preprocess', data, is_json)
+
+        images = None
+        if self._executor.stacks_images(predict_name):
+            # Images are decoded while the previous batch is in inference
+            async with self._stages['preprocess']:
+                images = await self._executor.stack_images(data)
+
+        async with self._stages['predict']:
+            res = await self._executor.run(
+                predict_name, data, is_json, images)
+
+        if self._has_postprocess:
+            async with self._stages['postprocess']:
+                res = await self._executor.run_stage(
+                    'postprocess', res, is_json)
 
         return res
 
-    async def predict(self, data, is_json: bool, path: str):
+    async def predict(self, data, is_json: bool, path: str, token=None,
+                      deadline=None, transport=None):
         predict_name = path2def_name(path)
+        request = PendingRequest(data, token, deadline, transport)
         if self._async:
-            return (await self._predict([data], is_json, predict_name))[0]
-        queue = asyncio.Queue(maxsize=1)
-        # print('Putting in queue')
-        self._queue.put_nowait((queue, data, predict_name, is_json))
-        # print('Waiting from queue')
-        resp = await queue.get()
-        # print('Got from queue')
-        return resp
+            await self._process_batch((predict_name, is_json), [request])
+        else:
+            self._requests_manager[predict_name, is_json].put(request)
+        return await request.future
@@ -1,4 +1,111 @@
+import asyncio
+
+from .scheduling import FairQueue
+
+
+class PendingRequest:
+    __slots__ = ('future', 'data', 'token', 'created_at', 'deadline',
+                 'transport')
+
+    def __init__(self, data, token=None, deadline=None, transport=None):
+        loop = asyncio.get_event_loop()
+        self.future = loop.create_future()
+        self.data = data
+        self.token = token
+        self.created_at = loop.time()
+        # Loop time after which nobody waits for the result
+        self.deadline = deadline
+        # Connection of the client waiting for the result
+        self.transport = transport
+
+    @property
+    def is_abandoned(self):
+        if self.future.done():
+            return True
+        if self.transport is not None and self.transport.is_closing():
+            return True
+        if self.deadline is not None \
+                and asyncio.get_event_loop().time() >= self.deadline:
+            return True
+        return False
+
+    def abandon(self):
+        if not self.future.done():
+            self.future.set_exception(asyncio.TimeoutError())
+
+    @property
+    def cost(self):
+        return len(self.data) if isinstance(self.data, list) else 1
+
+
+class RouteQueue:
+    """Queue of pending requests of one (predict_name, is_json) key
+    with its own batching settings and concurrency limit.
+    Requests of different tokens are scheduled according to policy."""
+
+    def __init__(self, key, batch_size=4, max_wait=0.005, concurrency=1,
+                 policy=None):
+        self.key = key
+        self.batch_size = batch_size
+        # How long the oldest request of a batch may wait for the batch
+        # to be filled up before it is flushed anyway
+        self.max_wait = max_wait
+        # Number of batches of the route which may be processed
+        # at the same time
+        self.slots = asyncio.Semaphore(concurrency)
+        # Tunes batch_size and max_wait if adaptive batching is enabled
+        self.controller = None
+        self._queue = FairQueue(policy)
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    @property
+    def as_dict(self):
+        return {
+            'predict_name': self.key[0],
+            'is_json': self.key[1],
+            'queue_size': len(self),
+            'batch_size': self.batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'adaptive': (
+                self.controller.as_dict
+                if self.controller is not None else None),
+        }
+
+    def put(self, request):
+        self._queue.put_nowait(request, request.token, request.cost)
+
+    def _is_batch_full(self, batch) -> bool:
+        bs = self.batch_size
+        return bool(bs) and len(batch) >= bs
+
+    async def collect_batch(self):
+        loop = asyncio.get_event_loop()
+        # Sleep until the first request arrives
+        request = await self._queue.get()
+        batch = [request]
+        deadline = request.created_at + self.max_wait
+        while not self._is_batch_full(batch):
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+        return batch
+
+
 class RequestsManager(dict):
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+
     def __getitem__(self, key):
         if isinstance(key, list):
             key = tuple(key)
@@ -7,7 +114,10 @@ class RequestsManager(dict):
             or not isinstance(key[0], str)
             or not isinstance(key[1], bool)):
             raise Exception("Invalid key")
-        if not super().get(key):
-            super().__setitem__(key, [])
+        if key not in self:
+            super().__setitem__(key, self._factory(key))
 
         return super().__getitem__(key)
+
+    def total(self):
+        return sum(len(v) for v in self.values())
@@ -0,0 +1,83 @@
+import asyncio
+import heapq
+import itertools
+
+
+class SchedulingPolicy:
+    """Maps passphrase tokens to priority classes and weights"""
+
+    def __init__(self, classes=None, default_class=None, tokens=None):
+        # Lower priority value is served first
+        self._classes = classes or {}
+        self._default_priority = self._classes.get(default_class, 0)
+        self._tokens = tokens or {}
+
+    def get(self, token):
+        """Returns priority and weight of the token"""
+        token_config = self._tokens.get(token, {})
+        priority = self._classes.get(
+            token_config.get('class'), self._default_priority)
+        return priority, token_config.get('weight', 1)
+
+
+class FairQueue:
+    """Queue serving priority classes strictly by priority and tokens
+    within a class by self-clocked weighted fair queuing.
+
+    Every request gets a virtual finish tag, tokens with bigger weight
+    advance their tags slower and are served more often, so one client
+    sending large requests can not starve the others. Requests are
+    served by the smallest finish tag and virtual time of the class is
+    the finish tag of the last served request.
+    """
+
+    def __init__(self, policy=None):
+        self._policy = policy or SchedulingPolicy()
+        # priority -> heap of (tag, seq, request)
+        self._heaps = {}
+        # priority -> virtual time of the class
+        self._vtime = {}
+        # (priority, token) -> last finish tag of the token
+        self._finish = {}
+        self._seq = itertools.count()
+        self._size = 0
+        self._not_empty = asyncio.Event()
+
+    def qsize(self):
+        return self._size
+
+    def empty(self):
+        return self._size == 0
+
+    def put_nowait(self, request, token=None, cost=1):
+        priority, weight = self._policy.get(token)
+        start = max(self._vtime.get(priority, 0.),
+                    self._finish.get((priority, token), 0.))
+        tag = start + cost / weight
+        self._finish[priority, token] = tag
+        heapq.heappush(
+            self._heaps.setdefault(priority, []),
+            (tag, next(self._seq), request))
+        self._size += 1
+        self._not_empty.set()
+
+    def get_nowait(self):
+        for priority in sorted(self._heaps):
+            heap = self._heaps[priority]
+            if heap:
+                tag, _, request = heapq.heappop(heap)
+                self._vtime[priority] = tag
+                self._size -= 1
+                if not heap:
+                    # Forget finish tags of idle tokens
+                    self._finish = {
+                        k: v for k, v in self._finish.items()
+                        if k[0] != priority}
+                return request
+        raise asyncio.QueueEmpty()
+
+    async def get(self):
+        while self.empty():
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
@@ -0,0 +1,130 @@
+import copy
+import mmap
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from ..models import WrappaObject, WrappaFile, WrappaImage, WrappaTensor
+
+# Smaller payloads are cheaper to pickle than to put in shared memory
+MIN_SHARED_PAYLOAD_SIZE = 16 * 1024
+
+
+class SharedPayload:
+    __slots__ = ('name', 'size')
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+def ensure_resource_tracker():
+    # Worker processes have to share resource tracker with the parent,
+    # otherwise blocks created by a worker would be unlinked on its exit
+    resource_tracker.ensure_running()
+
+
+def _pack_file(obj, blocks):
+    payload = obj._payload
+    if not isinstance(payload, (bytes, bytearray, memoryview, mmap.mmap)):
+        return obj
+    obj = copy.copy(obj)
+    if len(payload) < MIN_SHARED_PAYLOAD_SIZE:
+        if not isinstance(payload, bytes):
+            # Memory maps can not be pickled
+            obj._payload = bytes(payload)
+        return obj
+    size = len(payload)
+    shm = SharedMemory(create=True, size=size)
+    shm.buf[:size] = payload
+    blocks.append(shm)
+    obj._payload = SharedPayload(shm.name, size)
+    if isinstance(obj, WrappaImage):
+        # Decoded image is bigger than its payload, decode it again
+        obj._img_as_ndarray = None
+    elif isinstance(obj, WrappaTensor):
+        # Array is a view of the payload
+        obj._array = None
+    return obj
+
+
+def _pack(data, blocks):
+    if isinstance(data, list):
+        return [_pack(x, blocks) for x in data]
+    if isinstance(data, WrappaObject):
+        packed = copy.copy(data)
+        if data.image is not None:
+            packed._image = _pack_file(data.image, blocks)
+        if data.file is not None:
+            packed._file = _pack_file(data.file, blocks)
+        if data.tensor is not None:
+            packed._tensor = _pack_file(data.tensor, blocks)
+        return packed
+    if isinstance(data, WrappaFile):
+        return _pack_file(data, blocks)
+    return data
+
+
+def pack(data):
+    """Moves payloads of wrappa objects to shared memory.
+
+    Returns copy of data referencing shared memory blocks instead of
+    payloads and list of created blocks. Data itself is left untouched.
+    """
+    blocks = []
+    try:
+        return _pack(data, blocks), blocks
+    except:
+        release(blocks)
+        raise
+
+
+def _unpack_file(obj, unlink, blocks):
+    payload = obj._payload
+    if isinstance(payload, SharedPayload):
+        shm = SharedMemory(name=payload.name)
+        if blocks is not None:
+            # Payload is a view of the block, it's closed by the caller
+            blocks.append(shm)
+            obj._payload = shm.buf[:payload.size]
+            return
+        try:
+            obj._payload = bytes(shm.buf[:payload.size])
+        finally:
+            shm.close()
+            if unlink:
+                shm.unlink()
+
+
+def unpack(data, unlink=False, blocks=None):
+    """Reads payloads packed by `pack` back from shared memory in place.
+
+    If blocks list is passed, payloads are views of shared memory instead
+    of copies, opened blocks are appended to the list to be closed once
+    the data is not used anymore.
+    """
+    if isinstance(data, list):
+        for x in data:
+            unpack(x, unlink, blocks)
+    elif isinstance(data, WrappaObject):
+        for obj in (data.image, data.file, data.tensor):
+            if obj is not None:
+                _unpack_file(obj, unlink, blocks)
+    elif isinstance(data, WrappaFile):
+        _unpack_file(data, unlink, blocks)
+    return data
+
+
+def release(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+def close(blocks):
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            # Views of the block are still referenced, the block is
+            # closed once they are collected
+            pass
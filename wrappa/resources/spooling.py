@@ -0,0 +1,51 @@
+import mmap
+import tempfile
+
+
+class SpooledPart:
+    """Body of a multipart part kept in memory until it grows over
+    max_memory_size, after that it is spooled to a temporary file"""
+
+    def __init__(self, name, filename, max_memory_size=0, spool_dir=None):
+        self.name = name
+        self.filename = filename
+        self.size = 0
+        self._max_memory_size = max_memory_size
+        self._spool_dir = spool_dir
+        self._chunks = []
+        self._file = None
+
+    @property
+    def in_memory(self):
+        return self._file is None
+
+    def write(self, chunk):
+        if self._file is None \
+                and self.size + len(chunk) > self._max_memory_size:
+            self._file = tempfile.TemporaryFile(dir=self._spool_dir)
+            for c in self._chunks:
+                self._file.write(c)
+            self._chunks = []
+        if self._file is None:
+            self._chunks.append(chunk)
+        else:
+            self._file.write(chunk)
+        self.size += len(chunk)
+
+    def getbuffer(self):
+        """Returns bytes of in-memory part or read-only memory map
+        of the spooled one, the part must not be used after that"""
+        if self._file is None:
+            payload = b''.join(self._chunks)
+            self._chunks = []
+            return payload
+        self._file.flush()
+        try:
+            if not self.size:
+                return b''
+            # Mapping stays valid after the file is closed
+            return mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            self._file.close()
+            self._file = None
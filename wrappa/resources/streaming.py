@@ -0,0 +1,43 @@
+import uuid
+
+from aiohttp.payload import Payload
+
+
+class MultipartStream:
+    """Writes multipart/form-data body into a prepared StreamResponse part
+    by part, so every part is sent as soon as it is ready"""
+
+    def __init__(self, response, boundary=None):
+        self._response = response
+        self.boundary = boundary or uuid.uuid4().hex
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data;boundary={}'.format(self.boundary)
+
+    async def append(self, name, value, filename=None, content_type=None,
+                     headers=None):
+        """value is str, bytes-like object or aiohttp Payload"""
+        disposition = 'form-data; name="{}"'.format(name)
+        if filename is not None:
+            disposition += '; filename="{}"'.format(filename)
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+            content_type = content_type or 'text/plain; charset=utf-8'
+        part_headers = '--{}\r\nContent-Disposition: {}\r\n'.format(
+            self.boundary, disposition)
+        if content_type is not None:
+            part_headers += 'Content-Type: {}\r\n'.format(content_type)
+        for k, v in (headers or {}).items():
+            part_headers += '{}: {}\r\n'.format(k, v)
+        await self._response.write(
+            (part_headers + '\r\n').encode('utf-8'))
+        if isinstance(value, Payload):
+            await value.write(self._response)
+        else:
+            await self._response.write(value)
+        await self._response.write(b'\r\n')
+
+    async def close(self):
+        await self._response.write(
+            '--{}--\r\n'.format(self.boundary).encode('utf-8'))
@@ -0,0 +1,249 @@
+import asyncio
+import collections
+import tempfile
+
+from aiohttp import web
+
+from ..common.buffers import as_memoryview
+
+READ_CHUNK_SIZE = 1024 ** 2
+
+
+class ResultBody:
+    """Body of rendered response kept in memory until it grows over
+    spill_size, after that it is spilled to a temporary file"""
+
+    def __init__(self, spill_size=1024 ** 2, spool_dir=None):
+        self._file = tempfile.SpooledTemporaryFile(
+            max_size=spill_size, dir=spool_dir)
+        self._spill_size = spill_size
+        self.size = 0
+
+    @property
+    def spilled(self):
+        return self.size > self._spill_size
+
+    async def write(self, data):
+        self._file.write(data)
+        self.size += as_memoryview(data).nbytes
+
+    async def iter_chunks(self):
+        loop = asyncio.get_event_loop()
+        self._file.seek(0)
+        while True:
+            if self.spilled:
+                chunk = await loop.run_in_executor(
+                    None, self._file.read, READ_CHUNK_SIZE)
+            else:
+                chunk = self._file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    async def send(self, response):
+        async for chunk in self.iter_chunks():
+            await response.write(chunk)
+
+    def close(self):
+        self._file.close()
+
+
+class RenderedResult:
+    """Response rendered once async task is done, so neither inputs
+    nor DSModel output are kept until the client fetches it"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @classmethod
+    async def from_response(cls, response, **kwargs):
+        body = ResultBody(**kwargs)
+        await body.write(response.body)
+        return cls(response.status, dict(response.headers), body)
+
+    async def send(self, request):
+        response = web.StreamResponse(status=self.status)
+        response.headers.update(self.headers)
+        response.content_length = self.body.size
+        await response.prepare(request)
+        await self.body.send(response)
+        return response
+
+    def close(self):
+        self.body.close()
+
+
+class AsyncTask:
+    __slots__ = ('task', 'token', 'finished_at')
+
+    def __init__(self, task, token=None):
+        self.task = task
+        self.token = token
+        self.finished_at = None
+
+
+class TaskStore:
+    """Async tasks by their ids.
+
+    Results of tasks are expected to be RenderedResult or None if there is
+    nothing to keep, e.g. it's delivered to callback url. Finished tasks are
+    evicted ttl seconds after they are done, and the oldest of them are
+    evicted once there are more than max_tasks tasks or their results
+    take more than max_size bytes.
+    """
+
+    def __init__(self, ttl=3600, max_tasks=None, max_size=None):
+        self.ttl = ttl
+        self.max_tasks = max_tasks
+        self.max_size = max_size
+        self.evicted = 0
+        self.pending = 0
+        self._results_size = 0
+        # Tasks are ordered by the time they are done
+        self._tasks = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def add(self, task_id, task, token=None):
+        self._tasks[task_id] = AsyncTask(task, token)
+        self.pending += 1
+        task.add_done_callback(
+            lambda _: self._on_done(task_id))
+
+    def get(self, task_id) -> AsyncTask:
+        return self._tasks.get(task_id)
+
+    def _status(self, task_id):
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            return 'not_found'
+        if not entry.task.done():
+            return 'pending'
+        if entry.task.cancelled() or entry.task.exception() is not None:
+            return 'failed'
+        return 'done'
+
+    async def status(self, task_ids):
+        """Statuses of tasks: pending, done, failed or not_found"""
+        return {x: self._status(x) for x in task_ids}
+
+    async def wait(self, task_ids, timeout):
+        """Waits until at least one of tasks is done"""
+        tasks = []
+        for task_id in task_ids:
+            entry = self._tasks.get(task_id)
+            if entry is None or entry.task.done():
+                return
+            tasks.append(entry.task)
+        if timeout and tasks:
+            # Tasks are not cancelled if waiting is
+            await asyncio.wait(
+                tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+    async def claim(self, task_id):
+        """Returns status of task along with its RenderedResult and token.
+        Finished task is removed from the store, the result has to be
+        closed by the caller"""
+        status = self._status(task_id)
+        if status in ('pending', 'not_found'):
+            return status, None, None
+        entry = self.pop(task_id)
+        return status, self._result(entry.task), entry.token
+
+    def pop(self, task_id) -> AsyncTask:
+        """Removes task from the store, its result has to be closed
+        by the caller"""
+        entry = self._tasks.pop(task_id, None)
+        if entry is None:
+            return None
+        if entry.finished_at is None:
+            self.pending -= 1
+        self._results_size -= self._result_size(entry.task)
+        return entry
+
+    @staticmethod
+    def _result(task):
+        if task.done() and not task.cancelled() \
+                and task.exception() is None:
+            return task.result()
+        return None
+
+    def _result_size(self, task):
+        result = self._result(task)
+        return result.body.size if result is not None else 0
+
+    def _on_done(self, task_id):
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            return
+        loop = asyncio.get_event_loop()
+        entry.finished_at = loop.time()
+        self.pending -= 1
+        if self._status(task_id) == 'done' \
+                and self._result(entry.task) is None:
+            # Result is delivered, there is nothing to keep
+            self._tasks.pop(task_id)
+            return
+        self._results_size += self._result_size(entry.task)
+        self._tasks.move_to_end(task_id)
+        self.evict()
+        loop.call_later(self.ttl, self.evict)
+
+    def _evict_oldest(self):
+        for task_id, entry in self._tasks.items():
+            if entry.finished_at is not None:
+                self._evict(task_id)
+                return True
+        return False
+
+    def _evict(self, task_id):
+        entry = self.pop(task_id)
+        if entry.finished_at is None:
+            entry.task.cancel()
+        result = self._result(entry.task)
+        if result is not None:
+            result.close()
+        self.evicted += 1
+
+    def clear(self):
+        for task_id in list(self._tasks):
+            self._evict(task_id)
+
+    async def close(self):
+        self.clear()
+
+    def evict(self):
+        now = asyncio.get_event_loop().time()
+        expired = []
+        for task_id, entry in self._tasks.items():
+            if entry.finished_at is None:
+                continue
+            if entry.finished_at + self.ttl > now:
+                # The rest of tasks are done later
+                break
+            expired.append(task_id)
+        for task_id in expired:
+            self._evict(task_id)
+        while self.max_tasks is not None \
+                and len(self._tasks) > self.max_tasks:
+            if not self._evict_oldest():
+                break
+        while self.max_size is not None \
+                and self._results_size > self.max_size:
+            if not self._evict_oldest():
+                break
+
+    @property
+    def as_dict(self):
+        return {
+            'tasks': len(self._tasks),
+            'pending': self.pending,
+            'results_size': self._results_size,
+            'evicted': self.evicted,
+        }
@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+from PIL import Image
+from aiohttp import FormData
+
+from ...app import App
+
+
+class DSModel:
+    """Model answering every object with the same JSON"""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def predict(self, data, as_json=False):
+        return [{'done': True} for _ in data]
+
+
+def image_bytes():
+    buf = io.BytesIO()
+    Image.fromarray(np.zeros((4, 6, 3), dtype=np.uint8)).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def image_form():
+    form = FormData()
+    form.add_field('image', image_bytes(), filename='0.png')
+    return form
+
+
+def create_app(model_class=DSModel, input=('image',), output=('json',),
+               predict_aliases=(), model_config=None, **kwargs):
+    """model_config is merged into ds_model_config, e.g. to set executor"""
+    ds_model_config = {
+        'model_class': model_class,
+        'config': {},
+        'predict_aliases': list(predict_aliases),
+    }
+    ds_model_config.update(model_config or {})
+    return App(
+        port=0,
+        disable_consul=True,
+        server_info={
+            'specification': {
+                'input': list(input),
+                'output': list(output),
+            },
+        },
+        ds_model_config=ds_model_config,
+        **kwargs,
+    )
+
+
+async def get_ds_model(app):
+    """Instance of DSModel of the app, it's created on first request"""
+    predict = app._predictor
+    await predict._init()
+    return predict._predictor._executor._ds_model
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+from aiohttp.test_utils import TestServer, TestClient
+
+from . import helpers
+from .helpers import create_app, image_form
+
+
+class DSModel(helpers.DSModel):
+    def predict(self, data, as_json=False):
+        time.sleep(0.3)
+        return super().predict(data, as_json)
+
+
+def test_burst_over_queue_size_is_rejected():
+    async def main():
+        app = create_app(
+            DSModel, limits={'max_queue_size': 1, 'retry_after': 2})
+        async with TestClient(TestServer(app.app)) as client:
+            responses = await asyncio.gather(*[
+                client.post('/predict', data=image_form(),
+                            headers={'Accept': 'application/json'})
+                for _ in range(20)])
+            statuses = [resp.status for resp in responses]
+            assert statuses.count(200) == 1
+            assert statuses.count(503) == 19
+            rejected = next(x for x in responses if x.status == 503)
+            assert rejected.headers['Retry-After'] == '2'
+            assert app._predictor._admission.admitted == 0
+
+    asyncio.run(main())
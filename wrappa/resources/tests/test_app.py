@@ -0,0 +1,27 @@
+import asyncio
+
+from aiohttp.test_utils import TestServer, TestClient
+
+from .helpers import create_app
+
+
+async def _get_stats(app):
+    async with TestClient(TestServer(app.app)) as client:
+        resp = await client.get('/stats')
+        return await resp.read()
+
+
+def test_apps_keep_their_own_config():
+    async def main():
+        indented = create_app(json={'indent': 2, 'encoder': 'json'})
+        compact = create_app(
+            json={'encoder': 'json'}, encoding={'jpeg': {'quality': 10}})
+        return (await _get_stats(indented), await _get_stats(compact),
+                indented._predictor._encode_options)
+
+    indented, compact, encode_options = asyncio.run(main())
+
+    # The second app does not override config of the first one
+    assert b'\n' in indented
+    assert b'\n' not in compact
+    assert encode_options == {}
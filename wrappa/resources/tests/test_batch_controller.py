@@ -0,0 +1,56 @@
+from ..batch_controller import AdaptiveBatchController
+
+
+class _Route:
+    def __init__(self, batch_size, max_wait, queue_size=0):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+
+    def __len__(self):
+        return self.queue_size
+
+
+class _Request:
+    def __init__(self, created_at):
+        self.created_at = created_at
+
+
+def _observe(controller, batch_size, latency, times=10):
+    for _ in range(times):
+        batch = [_Request(0.)] * batch_size
+        controller.observe(batch, latency / 2, latency)
+
+
+def test_grows_batch_below_target():
+    route = _Route(4, 0.005)
+    controller = AdaptiveBatchController(
+        route, max_batch_size=8, target_p99_ms=100, adjust_every=10)
+
+    _observe(controller, 4, 0.01)
+
+    assert route.batch_size == 5
+    assert route.max_wait > 0.005
+
+
+def test_shrinks_batch_above_target():
+    route = _Route(8, 0.04)
+    controller = AdaptiveBatchController(
+        route, max_batch_size=8, target_p99_ms=100, adjust_every=10)
+
+    _observe(controller, 8, 0.5)
+
+    assert route.batch_size == 4
+    assert route.max_wait == 0.02
+    assert controller.as_dict['p99_ms'] == 500
+
+
+def test_respects_bounds():
+    route = _Route(2, 0.005)
+    controller = AdaptiveBatchController(
+        route, min_batch_size=2, max_batch_size=8, target_p99_ms=100,
+        adjust_every=10)
+
+    _observe(controller, 2, 0.5)
+
+    assert route.batch_size == 2
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from aiohttp.test_utils import TestServer, TestClient
+
+from . import helpers
+from .helpers import create_app, image_form
+from ..predictor import Predictor
+from ..requests_manager import PendingRequest
+
+DELAY = 0.3
+
+
+class DSModel(helpers.DSModel):
+    def predict(self, data, as_json=False):
+        time.sleep(DELAY)
+        return super().predict(data, as_json)
+
+
+async def _post(app, path='/predict', headers=None):
+    async with TestClient(TestServer(app.app)) as client:
+        resp = await client.post(
+            path, data=image_form(),
+            headers=dict(headers or {}, Accept='application/json'))
+        return resp.status, await resp.json()
+
+
+def test_timeout_header():
+    status, body = asyncio.run(_post(
+        create_app(DSModel), headers={'X-Request-Timeout': '0.05'}))
+
+    assert status == 504
+    assert body['errno'] == 13
+
+
+def test_request_timeout_config():
+    app = create_app(DSModel, limits={'request_timeout': 0.05})
+
+    status, _ = asyncio.run(_post(app))
+
+    assert status == 504
+
+
+def test_async_task_ignores_request_timeout_config():
+    async def main():
+        app = create_app(DSModel, limits={'request_timeout': 0.05})
+        async with TestClient(TestServer(app.app)) as client:
+            # The model is busy, so the task waits in the queue
+            # longer than request_timeout
+            busy = asyncio.ensure_future(client.post(
+                '/predict?async=true', data=image_form(),
+                headers={'Accept': 'application/json'}))
+            await asyncio.sleep(0.1)
+            resp = await client.post(
+                '/predict?async=true', data=image_form(),
+                headers={'Accept': 'application/json'})
+            task_id = (await resp.json())['task_id']
+            resp = await client.get('/result/{}?wait=5'.format(task_id))
+            await busy
+            return resp.status, await resp.json()
+
+    status, body = asyncio.run(main())
+
+    assert status == 200
+    assert body == {'done': True}
+
+
+class RecordingDSModel:
+    def __init__(self, **kwargs):
+        self.calls = []
+
+    def predict(self, data, as_json=False):
+        self.calls.append(list(data))
+        return list(data)
+
+
+class Transport:
+    def __init__(self, closing):
+        self._closing = closing
+
+    def is_closing(self):
+        return self._closing
+
+
+def test_abandoned_requests_are_removed_from_batch():
+    async def main():
+        predictor = await Predictor.create({
+            'model_class': RecordingDSModel,
+            'config': {},
+            'executor': 'loop',
+        })
+        loop = asyncio.get_event_loop()
+        requests = [
+            PendingRequest('expired', deadline=loop.time() - 1),
+            PendingRequest('closed', transport=Transport(True)),
+            PendingRequest('alive', deadline=loop.time() + 60,
+                           transport=Transport(False)),
+        ]
+        await predictor._process_batch(('predict', True), requests)
+        return predictor._executor._ds_model.calls, requests
+
+    calls, requests = asyncio.run(main())
+
+    assert calls == [['alive']]
+    for request in requests[:2]:
+        assert isinstance(request.future.exception(), asyncio.TimeoutError)
+    assert requests[2].future.result() == 'alive'
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+from aiohttp.test_utils import TestServer, TestClient
+
+from .helpers import create_app, get_ds_model, image_form
+from .. import executors
+from ..executors import get_method, has_images_argument, stack_batch_images
+from ..predictor import Predictor
+from ...models import WrappaImage, WrappaObject
+
+DELAY = 0.5
+
+
+class DSModel:
+    def predict(self, data):
+        # Local variable is not an argument asking for stacked images
+        images = [x.image for x in data]
+        return [{'count': len(images)}]
+
+    def predict_batch(self, data, as_json=False, images=None):
+        return [{'shape': list(images.shape)}]
+
+
+def _data():
+    image = WrappaImage.init_from_ndarray(
+        np.zeros((4, 5, 3), dtype=np.uint8), 'png')
+    return [WrappaObject(image)]
+
+
+def test_local_variables_are_not_arguments():
+    assert not has_images_argument(DSModel(), 'predict')
+
+    method, f_kwargs = get_method(DSModel(), 'predict', True)
+
+    assert f_kwargs == {}
+    assert method(_data(), **f_kwargs) == [{'count': 1}]
+
+
+def test_images_are_stacked_for_images_argument():
+    assert has_images_argument(DSModel(), 'predict_batch')
+
+    images = stack_batch_images(_data(), {})
+    method, f_kwargs = get_method(DSModel(), 'predict_batch', True, images)
+
+    assert f_kwargs['as_json'] is True
+    assert f_kwargs['images'].shape == (1, 4, 5, 3)
+
+
+def test_images_are_stacked_outside_of_inference_thread(monkeypatch):
+    threads = []
+
+    class StackingDSModel(DSModel):
+        def predict_batch(self, data, as_json=False, images=None):
+            threads.append(threading.current_thread().name)
+            return super().predict_batch(data, as_json, images)
+
+    def stack(data, batch_decode):
+        threads.append(threading.current_thread().name)
+        return stack_batch_images(data, batch_decode)
+
+    monkeypatch.setattr(executors, 'stack_batch_images', stack)
+
+    async def main():
+        predictor = await Predictor.create({
+            'model_class': StackingDSModel,
+            'config': {},
+            'batch_decode': {},
+        })
+        result = await predictor.predict(_data()[0], True, '/predict_batch')
+        await predictor.close()
+        return result
+
+    assert asyncio.run(main()) == {'shape': [1, 4, 5, 3]}
+    assert threads[0].startswith('wrappa-stage')
+    assert threads[1].startswith('wrappa-model')
+
+class ThreadBoundDSModel:
+    """Records threads it was created and called in"""
+
+    def __init__(self, **kwargs):
+        self.threads = [threading.current_thread().name]
+
+    def predict(self, data, as_json=False):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(DELAY)
+        return [{'done': True} for _ in data]
+
+
+def test_server_answers_while_sync_batch_runs():
+    async def main():
+        app = create_app(ThreadBoundDSModel)
+        async with TestClient(TestServer(app.app)) as client:
+            busy = asyncio.ensure_future(client.post(
+                '/predict', data=image_form(),
+                headers={'Accept': 'application/json'}))
+            model = await get_ds_model(app)
+            while len(model.threads) < 2:
+                await asyncio.sleep(0.01)
+
+            loop = asyncio.get_event_loop()
+            started_at = loop.time()
+            resp = await client.get('/healthcheck')
+            assert resp.status == 204
+            # Malformed request is parsed and rejected meanwhile
+            resp = await client.post(
+                '/predict', data=b'{', headers={
+                    'Accept': 'application/json',
+                    'Content-Type': 'multipart/form-data; boundary=x'})
+            assert resp.status == 400
+            assert loop.time() - started_at < DELAY / 2
+            assert not busy.done()
+
+            resp = await busy
+            assert resp.status == 200
+            return model.threads
+
+    threads = asyncio.run(main())
+
+    # Model is created in the thread running predict
+    assert threads[0] == threads[1]
+    assert threads[0].startswith('wrappa-model')
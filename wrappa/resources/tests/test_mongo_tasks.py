@@ -0,0 +1,276 @@
+import asyncio
+import collections
+import itertools
+
+from ..mongo_tasks import MongoTaskStore
+from ..tasks import RenderedResult, ResultBody
+
+_OPERATORS = {
+    '$in': lambda value, arg: value in arg,
+    '$gt': lambda value, arg: value is not None and value > arg,
+    '$lt': lambda value, arg: value is not None and value < arg,
+}
+
+
+def _get(doc, key):
+    for part in key.split('.'):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        value = _get(doc, key)
+        if isinstance(cond, dict):
+            if not all(_OPERATORS[op](value, arg)
+                       for op, arg in cond.items()):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """In-memory stand-in of motor collection"""
+
+    def __init__(self):
+        self.docs = collections.OrderedDict()
+        self.indexes = []
+        self.fail = False
+
+    async def create_index(self, key, **kwargs):
+        self.indexes.append((key, kwargs))
+
+    async def insert_one(self, doc):
+        if self.fail:
+            raise ConnectionError('MongoDB is not available')
+        self.docs[doc['_id']] = dict(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                doc.update(update['$set'])
+                return
+        if upsert:
+            self.docs[query['_id']] = dict(query, **update['$set'])
+
+    async def delete_one(self, query):
+        for key, doc in list(self.docs.items()):
+            if _matches(doc, query):
+                del self.docs[key]
+                return
+
+    def find(self, query, projection=None):
+        return _Cursor([dict(doc) for doc in self.docs.values()
+                        if _matches(doc, query)])
+
+    async def find_one(self, query, projection=None):
+        async for doc in self.find(query):
+            return doc
+        return None
+
+    async def find_one_and_delete(self, query):
+        doc = await self.find_one(query)
+        if doc is not None:
+            del self.docs[doc['_id']]
+        return doc
+
+
+class _GridIn:
+    def __init__(self, bucket, metadata):
+        self._bucket = bucket
+        self._id = next(bucket.ids)
+        self._chunks = []
+        self._metadata = metadata
+
+    async def write(self, data):
+        self._chunks.append(bytes(data))
+
+    async def close(self):
+        self._bucket.files[self._id] = (self._chunks, self._metadata)
+
+    async def abort(self):
+        pass
+
+
+class _GridOut:
+    def __init__(self, file_id, chunks=()):
+        self._id = file_id
+        self._chunks = iter(chunks)
+
+    async def readchunk(self):
+        return next(self._chunks, b'')
+
+
+class FakeBucket:
+    """In-memory stand-in of motor GridFS bucket"""
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.files = {}
+
+    def open_upload_stream(self, filename, metadata=None):
+        return _GridIn(self, metadata)
+
+    async def open_download_stream(self, file_id):
+        return _GridOut(file_id, self.files[file_id][0])
+
+    async def delete(self, file_id):
+        del self.files[file_id]
+
+    def find(self, query):
+        return _Cursor([_GridOut(file_id)
+                        for file_id, (_, metadata) in self.files.items()
+                        if _matches({'metadata': metadata}, query)])
+
+
+class FakeDatabase(collections.defaultdict):
+    def __init__(self):
+        super().__init__(FakeCollection)
+        self.bucket = FakeBucket()
+
+
+def _replica(db):
+    store = MongoTaskStore(db, inline_size=10, poll_interval=0.01)
+    store._bucket = db.bucket
+    return store
+
+
+async def _render(body):
+    result = ResultBody()
+    await result.write(body)
+    return RenderedResult(200, {'Content-Type': 'text/plain'}, result)
+
+
+async def _read(rendered):
+    chunks = [chunk async for chunk in rendered.body.iter_chunks()]
+    rendered.close()
+    return b''.join(chunks)
+
+
+def test_results_are_shared_by_replicas():
+    async def main():
+        db = FakeDatabase()
+        first, second = _replica(db), _replica(db)
+        release = asyncio.Event()
+
+        async def predict(body):
+            await release.wait()
+            return await _render(body)
+
+        first.add('small', asyncio.ensure_future(predict(b'small')))
+        first.add('large', asyncio.ensure_future(predict(b'large' * 10)))
+        await asyncio.sleep(0)
+        assert await second.status(['small', 'unknown']) == {
+            'small': 'pending', 'unknown': 'not_found'}
+        assert (await second.claim('small'))[0] == 'pending'
+
+        release.set()
+        await second.wait(['small'], 5)
+        await first.wait(['large'], 5)
+        assert first.pending == 0
+
+        status, rendered, _ = await second.claim('small')
+        assert status == 'done' and await _read(rendered) == b'small'
+        assert (await first.claim('small'))[0] == 'not_found'
+
+        # Large result is stored in GridFS and removed once it's sent
+        assert len(db.bucket.files) == 1
+        status, rendered, _ = await second.claim('large')
+        assert status == 'done' and rendered.body.size == 50
+        assert await _read(rendered) == b'large' * 10
+        await second.close()
+        assert not db.bucket.files
+
+    asyncio.run(main())
+
+
+def test_failed_and_delivered_tasks():
+    async def main():
+        db = FakeDatabase()
+        store = _replica(db)
+
+        async def fail():
+            raise ValueError('failed')
+
+        async def deliver():
+            return None
+
+        store.add('failed', asyncio.ensure_future(fail()), token='t')
+        store.add('delivered', asyncio.ensure_future(deliver()))
+        await store.wait(['failed'], 5)
+        await store.wait(['delivered'], 5)
+        assert await store.claim('failed') == ('failed', None, 't')
+        assert await store.status(['delivered']) == {
+            'delivered': 'not_found'}
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_task_is_kept_locally_if_it_is_not_inserted():
+    async def main():
+        db = FakeDatabase()
+        store = _replica(db)
+        db['async_tasks'].fail = True
+        release = asyncio.Event()
+
+        async def predict():
+            await release.wait()
+            return await _render(b'data')
+
+        store.add('task', asyncio.ensure_future(predict()), token='t')
+        await asyncio.sleep(0)
+        assert await store.status(['task']) == {'task': 'pending'}
+
+        release.set()
+        await store.wait(['task'], 5)
+        status, rendered, token = await store.claim('task')
+        assert status == 'done' and token == 't'
+        assert await _read(rendered) == b'data'
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_pending_task_does_not_expire_while_running():
+    async def main():
+        db = FakeDatabase()
+        store = _replica(db)
+        store.ttl = 0.1
+        collection = db['async_tasks']
+        release = asyncio.Event()
+
+        async def predict():
+            await release.wait()
+            return await _render(b'data')
+
+        store.add('task', asyncio.ensure_future(predict()))
+        await asyncio.sleep(0.01)
+        inserted_at = collection.docs['task']['expires_at']
+        await asyncio.sleep(0.15)
+        assert collection.docs['task']['expires_at'] > inserted_at
+
+        # Result is stored even if the pending document is gone
+        del collection.docs['task']
+        release.set()
+        await store.wait(['task'], 5)
+        status, rendered, _ = await store.claim('task')
+        assert status == 'done' and await _read(rendered) == b'data'
+        await store.close()
+
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from .. import pdf
+from ..pdf import PdfRasterizer
+
+PAGES = 10
+
+
+def _render_pages(payload, first_page, last_page, dpi, grayscale):
+    return [np.full((2, 3, 3), page, dtype=np.uint8)
+            for page in range(first_page, last_page + 1)]
+
+
+def _patch(monkeypatch):
+    monkeypatch.setattr(pdf, '_count_pages', lambda payload: PAGES)
+    monkeypatch.setattr(pdf, '_render_pages', _render_pages)
+
+
+def test_pages_are_encoded_in_order(monkeypatch):
+    _patch(monkeypatch)
+    rasterizer = PdfRasterizer(pages_per_task=3, workers=2)
+
+    pages = asyncio.run(rasterizer.rasterize(b'', 'doc.pdf'))
+    rasterizer.close()
+
+    # Rendered arrays are not kept along with encoded pages
+    assert all(page._img_as_ndarray is None for page in pages)
+    assert pages[0]._payload[:2] == b'\xff\xd8'
+    assert [page.as_ndarray[0, 0, 0] for page in pages] == \
+           list(range(1, PAGES + 1))
+    assert [page.name for page in pages] == \
+           ['doc-{}.jpeg'.format(i) for i in range(PAGES)]
+
+
+def test_pages_as_arrays(monkeypatch):
+    _patch(monkeypatch)
+    rasterizer = PdfRasterizer(as_arrays=True)
+
+    pages = asyncio.run(rasterizer.rasterize(b'', 'doc.pdf'))
+    rasterizer.close()
+
+    # Pages are not encoded until payload is requested
+    assert pages[0]._payload is None
+    assert pages[0].as_ndarray[0, 0, 0] == 1
+    assert pages[0].payload[:2] == b'\xff\xd8'
+
+
+def test_chunks_rendered_ahead_are_limited(monkeypatch):
+    _patch(monkeypatch)
+    rendering = []
+    running = [0]
+    lock = threading.Lock()
+
+    def render(payload, first_page, last_page, dpi, grayscale):
+        with lock:
+            running[0] += 1
+            rendering.append(running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return _render_pages(payload, first_page, last_page, dpi, grayscale)
+
+    monkeypatch.setattr(pdf, '_render_pages', render)
+    rasterizer = PdfRasterizer(pages_per_task=1, prefetch_chunks=2, workers=8)
+
+    pages = asyncio.run(rasterizer.rasterize(b'', 'doc.pdf'))
+    rasterizer.close()
+
+    assert len(pages) == PAGES
+    assert max(rendering) <= 2
+
+
+def test_page_limits(monkeypatch):
+    _patch(monkeypatch)
+    rasterizer = PdfRasterizer(first_page=2, last_page=8, max_pages=5)
+
+    pages = asyncio.run(rasterizer.rasterize(b'', 'doc.pdf'))
+    rasterizer.close()
+
+    assert [page.as_ndarray[0, 0, 0] for page in pages] == [2, 3, 4, 5, 6]
+
+
+def test_pages_are_streamed(monkeypatch):
+    _patch(monkeypatch)
+    last_chunk = threading.Event()
+
+    def render(payload, first_page, last_page, dpi, grayscale):
+        if last_page == PAGES:
+            last_chunk.wait(5)
+        return _render_pages(payload, first_page, last_page, dpi, grayscale)
+
+    monkeypatch.setattr(pdf, '_render_pages', render)
+    rasterizer = PdfRasterizer(pages_per_task=5, workers=2)
+
+    async def first_page():
+        pages = rasterizer.iter_pages(b'', 'doc.pdf')
+        page = await pages.__anext__()
+        last_chunk.set()
+        await pages.aclose()
+        return page
+
+    page = asyncio.run(first_page())
+    rasterizer.close()
+
+    assert page.as_ndarray[0, 0, 0] == 1
+
+
+def test_all_pages_are_rendered_by_default(monkeypatch):
+    _patch(monkeypatch)
+    monkeypatch.setattr(pdf, '_count_pages', lambda payload: 30)
+    rasterizer = PdfRasterizer()
+
+    pages = asyncio.run(rasterizer.rasterize(b'', 'doc.pdf'))
+    rasterizer.close()
+
+    assert len(pages) == 30
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+from ..predictor import Predictor
+
+DELAY = 0.2
+
+
+class DSModel:
+    """Records stages batches go through"""
+
+    def __init__(self, **kwargs):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def _record(self, stage, data):
+        with self._lock:
+            self.events.append((stage, data[0]))
+
+    def preprocess(self, data, as_json=False):
+        self._record('preprocess', data)
+        return data
+
+    def predict(self, data, as_json=False):
+        self._record('predict', data)
+        time.sleep(DELAY)
+        self._record('predicted', data)
+        return data
+
+    def postprocess(self, data, as_json=False):
+        self._record('postprocess', data)
+        return [x.upper() for x in data]
+
+
+def test_stages_of_batches_overlap():
+    async def main():
+        predictor = await Predictor.create({
+            'model_class': DSModel,
+            'config': {},
+            'batch_size': 1,
+            'max_wait_ms': 0,
+        })
+        first = asyncio.ensure_future(
+            predictor.predict('a', True, '/predict'))
+        await asyncio.sleep(DELAY / 4)
+        second = await predictor.predict('b', True, '/predict')
+        results = [await first, second]
+        await predictor.close()
+        return predictor._executor._ds_model.events, results
+
+    events, results = asyncio.run(main())
+
+    assert results == ['A', 'B']
+    # The second batch is preprocessed while the first one is in inference
+    assert events.index(('predict', 'a')) \
+        < events.index(('preprocess', 'b')) \
+        < events.index(('predicted', 'a'))
+    assert events.index(('predicted', 'a')) < events.index(('predict', 'b'))
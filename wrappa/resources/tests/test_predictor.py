@@ -0,0 +1,154 @@
+import asyncio
+
+from ..predictor import Predictor
+from ..requests_manager import PendingRequest
+
+
+class DSModel:
+    """Echoes inputs and records batches it was called with"""
+
+    def __init__(self, **kwargs):
+        self.calls = []
+
+    def predict(self, data, as_json=False):
+        self.calls.append(list(data))
+        if 'poisoned' in data:
+            raise ValueError('poisoned input')
+        return [ValueError('bad input') if x == 'bad' else x for x in data]
+
+    def other(self, data, as_json=False):
+        self.calls.append(list(data))
+        return list(data)
+
+
+class ShortDSModel(DSModel):
+    def predict(self, data, as_json=False):
+        # Loses results of all inputs but the first one
+        return super().predict(data, as_json)[:1]
+
+
+async def _create(model_class=DSModel, **config):
+    return await Predictor.create(dict(
+        config, model_class=model_class, config={}, executor='loop'))
+
+
+def _is_error(result):
+    return isinstance(result, tuple) and isinstance(result[0], Exception)
+
+
+async def _process(model_class, data):
+    predictor = await _create(model_class)
+    requests = [PendingRequest(x) for x in data]
+    await predictor._process_batch(('predict', True), requests)
+    return (predictor._executor._ds_model.calls,
+            [x.future.result() for x in requests])
+
+
+def test_poisoned_input_is_found_by_bisection():
+    data = ['ok'] * 7 + ['poisoned']
+
+    calls, results = asyncio.run(_process(DSModel, data))
+
+    # The whole batch, then both halves on each of log2(8) levels
+    assert len(calls) == 1 + 2 * 3
+    assert results[:7] == ['ok'] * 7
+    assert _is_error(results[7])
+    assert str(results[7][0]) == 'poisoned input'
+
+
+def test_exception_returned_in_place_of_result():
+    calls, results = asyncio.run(_process(DSModel, ['a', 'bad', 'c']))
+
+    assert calls == [['a', 'bad', 'c']]
+    assert results[0] == 'a' and results[2] == 'c'
+    assert _is_error(results[1])
+    assert str(results[1][0]) == 'bad input'
+
+
+def test_results_of_wrong_length_are_retried_in_halves():
+    calls, results = asyncio.run(_process(ShortDSModel, ['a', 'b', 'c']))
+
+    assert calls == [['a', 'b', 'c'], ['a'], ['b', 'c'], ['b'], ['c']]
+    assert results == ['a', 'b', 'c']
+
+
+def test_batch_is_flushed_when_full():
+    async def main():
+        predictor = await _create(batch_size=2, max_wait_ms=10000)
+        results = await asyncio.wait_for(asyncio.gather(
+            predictor.predict('a', True, '/predict'),
+            predictor.predict('b', True, '/predict'),
+        ), 1)
+        await predictor.close()
+        return predictor._executor._ds_model.calls, results
+
+    calls, results = asyncio.run(main())
+
+    assert calls == [['a', 'b']]
+    assert results == ['a', 'b']
+
+
+def test_batch_is_flushed_after_max_wait():
+    async def main():
+        loop = asyncio.get_event_loop()
+        predictor = await _create(batch_size=4, max_wait_ms=50)
+        started_at = loop.time()
+        result = await predictor.predict('a', True, '/predict')
+        elapsed = loop.time() - started_at
+        await predictor.close()
+        return predictor._executor._ds_model.calls, result, elapsed
+
+    calls, result, elapsed = asyncio.run(main())
+
+    assert calls == [['a']]
+    assert result == 'a'
+    assert 0.04 <= elapsed < 1
+
+
+def test_routes_have_independent_queues():
+    async def main():
+        predictor = await _create(
+            batch_size=2, max_wait_ms=10000,
+            routes={'/other': {'batch_size': 1}})
+        waiting = asyncio.ensure_future(
+            predictor.predict('a', True, '/predict'))
+        # Batch of /predict is not full, but /other is not held by it
+        other = await asyncio.wait_for(
+            predictor.predict('x', True, '/other'), 1)
+        assert not waiting.done()
+        second = await asyncio.wait_for(
+            predictor.predict('b', True, '/predict'), 1)
+        await predictor.close()
+        return (predictor._executor._ds_model.calls,
+                [await waiting, other, second])
+
+    calls, results = asyncio.run(main())
+
+    assert calls == [['x'], ['a', 'b']]
+    assert results == ['a', 'x', 'b']
+
+
+class SlowDSModel(DSModel):
+    async def predict(self, data, as_json=False):
+        self.calls.append(list(data))
+        await asyncio.sleep(10)
+        return list(data)
+
+
+def test_running_batches_are_cancelled_on_close():
+    async def main():
+        predictor = await _create(SlowDSModel, batch_size=1)
+        request = asyncio.ensure_future(
+            predictor.predict('a', True, '/predict'))
+        while not predictor._executor._ds_model.calls:
+            await asyncio.sleep(0.01)
+        assert len(predictor._batches) == 1
+        await asyncio.wait_for(predictor.close(), 1)
+        assert not predictor._batches
+        done, _ = await asyncio.wait([request], timeout=1)
+        return done
+
+    done = asyncio.run(main())
+
+    assert len(done) == 1
+    assert next(iter(done)).cancelled()
@@ -0,0 +1,38 @@
+from ..scheduling import FairQueue, SchedulingPolicy
+
+
+def _drain(queue):
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+def test_heavy_request_does_not_starve_light_token():
+    queue = FairQueue()
+    queue.put_nowait('heavy', 'heavy', cost=100)
+    for i in range(3):
+        queue.put_nowait('light{}'.format(i), 'light')
+
+    assert _drain(queue) == ['light0', 'light1', 'light2', 'heavy']
+
+
+def test_weights_split_service():
+    queue = FairQueue(SchedulingPolicy(tokens={'a': {'weight': 3}}))
+    for token in ('a', 'b'):
+        for _ in range(8):
+            queue.put_nowait(token, token)
+
+    served = _drain(queue)[:8]
+
+    assert served.count('a') == 6
+    assert served.count('b') == 2
+
+
+def test_higher_priority_class_goes_first():
+    queue = FairQueue(SchedulingPolicy(
+        classes={'interactive': 0, 'bulk': 1},
+        default_class='bulk',
+        tokens={'vip': {'class': 'interactive'}}))
+    queue.put_nowait('bulk', 'other')
+    queue.put_nowait('vip-heavy', 'vip', cost=100)
+    queue.put_nowait('vip', 'vip')
+
+    assert _drain(queue) == ['vip-heavy', 'vip', 'bulk']
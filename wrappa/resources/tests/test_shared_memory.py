@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+
+from .. import shared_memory
+from ..executors import create_executor
+from ...models import WrappaFile, WrappaImage, WrappaObject, WrappaTensor
+
+SIZE = shared_memory.MIN_SHARED_PAYLOAD_SIZE * 2
+
+
+def _data():
+    image = WrappaImage.init_from_ndarray(
+        np.random.randint(0, 256, size=(128, 128, 3), dtype=np.uint8), 'png')
+    return [
+        WrappaObject(image, WrappaFile(payload=bytearray(SIZE), ext='bin')),
+        WrappaObject(WrappaTensor(payload=WrappaTensor.init_from_ndarray(
+            np.arange(SIZE)).payload)),
+    ]
+
+
+def test_pack_unpack():
+    data = _data()
+
+    packed, blocks = shared_memory.pack(data)
+    try:
+        assert len(blocks) == 3
+        assert isinstance(packed[0].file._payload,
+                          shared_memory.SharedPayload)
+        # Data itself is left untouched
+        assert isinstance(data[0].file._payload, bytearray)
+        shared_memory.unpack(packed)
+    finally:
+        shared_memory.release(blocks)
+
+    assert packed[0].image.payload == data[0].image.payload
+    assert packed[0].file.payload == bytes(SIZE)
+    assert np.all(packed[1].tensor.as_ndarray == np.arange(SIZE))
+
+
+class DSModel:
+    def __init__(self, **kwargs):
+        pass
+
+    def predict(self, data, as_json=False):
+        return [
+            WrappaObject(WrappaTensor.init_from_ndarray(
+                obj.image.as_ndarray.sum(axis=2) if obj.image is not None
+                else obj.tensor.as_ndarray * 2))
+            for obj in data
+        ]
+
+
+def test_worker_round_trip():
+    executor = create_executor({
+        'model_class': DSModel,
+        'config': {},
+        'executor': 'process',
+        'executor_workers': 1,
+    })
+    data = _data()
+    try:
+        res = asyncio.run(executor.run('predict', data, False))
+    finally:
+        executor.close()
+
+    assert np.all(res[0].tensor.as_ndarray ==
+                  data[0].image.as_ndarray.sum(axis=2))
+    assert np.all(res[1].tensor.as_ndarray == np.arange(SIZE) * 2)
+
+
+def test_unpacked_payloads_are_views():
+    data = _data()
+    packed, blocks = shared_memory.pack(data)
+    opened = []
+    try:
+        shared_memory.unpack(packed, blocks=opened)
+        assert len(opened) == 3
+        assert isinstance(packed[0].file._payload, memoryview)
+        assert packed[0].image.payload == data[0].image.payload
+        assert np.all(packed[1].tensor.as_ndarray == np.arange(SIZE))
+        del packed
+    finally:
+        shared_memory.close(opened)
+        shared_memory.release(blocks)
+    # Views are not referenced anymore, so blocks are closed
+    assert all(shm.buf is None for shm in opened)
@@ -0,0 +1,86 @@
+import asyncio
+import mmap
+
+from aiohttp import FormData
+from aiohttp.test_utils import TestServer, TestClient
+
+from .. import predict
+from ..spooling import SpooledPart
+from .helpers import create_app, image_bytes
+
+
+def test_part_is_kept_in_memory_within_budget():
+    part = SpooledPart('image', '0.png', max_memory_size=8)
+    part.write(b'1234')
+    part.write(b'5678')
+
+    assert part.in_memory
+    assert part.getbuffer() == b'12345678'
+
+
+def test_part_over_budget_is_spooled_to_mmap(tmpdir):
+    part = SpooledPart('image', '0.png', max_memory_size=6,
+                       spool_dir=str(tmpdir))
+    part.write(b'1234')
+    part.write(b'5678')
+
+    assert not part.in_memory
+    payload = part.getbuffer()
+    assert isinstance(payload, mmap.mmap)
+    assert payload[:] == b'12345678'
+    assert part.size == 8
+
+
+def _images_form(count):
+    form = FormData()
+    for i in range(count):
+        form.add_field('image-{}'.format(i), image_bytes(),
+                       filename='{}.png'.format(i))
+    return form
+
+
+async def _post(app, form):
+    async with TestClient(TestServer(app.app)) as client:
+        resp = await client.post(
+            '/predict', data=form, headers={'Accept': 'application/json'})
+        return resp.status
+
+
+def test_request_memory_is_shared_by_parts(monkeypatch):
+    spooled = []
+
+    class RecordingSpooledPart(SpooledPart):
+        def getbuffer(self):
+            spooled.append(not self.in_memory)
+            return super().getbuffer()
+
+    monkeypatch.setattr(predict, 'SpooledPart', RecordingSpooledPart)
+    app = create_app(
+        input=('image', 'list'),
+        limits={'max_request_memory': len(image_bytes()) * 3 // 2})
+
+    status = asyncio.run(_post(app, _images_form(3)))
+
+    assert status == 200
+    # The first file exhausts most of the budget, the rest go to disk
+    assert spooled == [False, True, True]
+
+
+def test_body_over_max_size_is_rejected_while_streaming(monkeypatch):
+    spooled = []
+
+    class RecordingSpooledPart(SpooledPart):
+        def getbuffer(self):
+            spooled.append(self.size)
+            return super().getbuffer()
+
+    monkeypatch.setattr(predict, 'SpooledPart', RecordingSpooledPart)
+    size = len(image_bytes())
+    app = create_app(input=('image', 'list'), max_request_size=size * 3 // 2)
+
+    status = asyncio.run(_post(app, _images_form(3)))
+
+    assert status == 413
+    # Reading stopped at the first chunk over the limit
+    assert len(spooled) == 2
+    assert spooled[1] < size
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+
+from aiohttp.test_utils import TestServer, TestClient
+from requests_toolbelt import MultipartDecoder
+
+from .helpers import create_app, get_ds_model, image_form
+from ...models import WrappaObject, WrappaText
+
+COUNT = 3
+
+
+class DSModel:
+    def __init__(self, **kwargs):
+        self.first_item_received = threading.Event()
+
+    def _items(self, as_json):
+        for i in range(COUNT):
+            if i == 1:
+                # Next items are produced only after the client got
+                # the first one, so the test hangs if it's not streamed
+                assert self.first_item_received.wait(5)
+            yield {'index': i} if as_json else \
+                WrappaObject(WrappaText(str(i)))
+
+    def predict(self, data, as_json=False):
+        return [self._items(as_json) for _ in data]
+
+    def predict_fail(self, data, as_json=False):
+        def items():
+            yield {'index': 0}
+            raise ValueError('failed')
+        return [items() for _ in data]
+
+
+async def _predict(path, accept, on_first_line=None):
+    app = create_app(DSModel, output=('text', 'json', 'list'),
+                     predict_aliases=['/predict/fail'])
+    async with TestClient(TestServer(app.app)) as client:
+        resp = await client.post(
+            path, data=image_form(), headers={'Accept': accept})
+        content_type = resp.headers['Content-Type']
+        lines = [await resp.content.readline()]
+        if on_first_line is not None:
+            (await get_ds_model(app)).first_item_received.set()
+        body = b''.join(lines) + await resp.read()
+        return resp.status, content_type, body
+
+
+def test_json_items_are_streamed():
+    status, content_type, body = asyncio.run(
+        _predict('/predict', 'application/json', on_first_line=True))
+
+    assert status == 200
+    assert content_type == 'application/x-ndjson'
+    assert [json.loads(line) for line in body.splitlines()] == \
+           [{'index': i} for i in range(COUNT)]
+
+
+def test_multipart_items_are_streamed():
+    status, content_type, body = asyncio.run(
+        _predict('/predict', 'multipart/form-data', on_first_line=True))
+
+    assert status == 200
+    parts = MultipartDecoder(body, content_type).parts
+    assert [part.text for part in parts] == [str(i) for i in range(COUNT)]
+
+
+def test_stream_failure_is_sent_last():
+    status, _, body = asyncio.run(_predict('/predict/fail', 'application/json'))
+
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert lines[0] == {'index': 0}
+    assert lines[1]['error']['message'] == 'DS model failed to process data'
+
+
+class IteratorDSModel:
+    def __init__(self, **kwargs):
+        pass
+
+    def predict(self, data, as_json=False):
+        # Iterators of lists are sent from worker processes
+        return [iter([{'index': i} for i in range(COUNT)]) for _ in data]
+
+
+def test_iterators_of_process_executor_are_streamed():
+    async def main():
+        app = create_app(
+            IteratorDSModel, output=('json', 'list'),
+            model_config={'executor': 'process', 'executor_workers': 1})
+        async with TestClient(TestServer(app.app)) as client:
+            resp = await client.post(
+                '/predict', data=image_form(),
+                headers={'Accept': 'application/json'})
+            return resp.status, await resp.read()
+
+    status, body = asyncio.run(main())
+
+    assert status == 200
+    assert [json.loads(line) for line in body.splitlines()] == \
+           [{'index': i} for i in range(COUNT)]
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+from aiohttp.test_utils import TestServer, TestClient
+
+from . import helpers
+from .helpers import create_app, get_ds_model, image_form
+from ..tasks import RenderedResult, ResultBody, TaskStore
+
+
+class DSModel(helpers.DSModel):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+
+    def predict(self, data, as_json=False):
+        assert self.release.wait(5)
+        return super().predict(data, as_json)
+
+
+async def _done_task(size, spill_size=1024 ** 2):
+    async def render():
+        body = ResultBody(spill_size=spill_size)
+        await body.write(b'x' * size)
+        return RenderedResult(200, {}, body)
+    task = asyncio.ensure_future(render())
+    await task
+    return task
+
+
+def test_result_body_spill():
+    async def main():
+        body = ResultBody(spill_size=10)
+        await body.write(b'0123456789')
+        assert not body.spilled
+        await body.write(memoryview(b'abc'))
+        assert body.spilled and body.size == 13
+
+        chunks = []
+
+        class Response:
+            async def write(self, chunk):
+                chunks.append(chunk)
+
+        await body.send(Response())
+        assert b''.join(chunks) == b'0123456789abc'
+        body.close()
+
+    asyncio.run(main())
+
+
+def test_ttl_eviction():
+    async def main():
+        store = TaskStore(ttl=0.05)
+        store.add('a', await _done_task(1))
+        assert 'a' in store
+        await asyncio.sleep(0)
+        assert store.pending == 0
+        await asyncio.sleep(0.1)
+        assert 'a' not in store and store.evicted == 1
+
+    asyncio.run(main())
+
+
+def test_size_eviction():
+    async def main():
+        store = TaskStore(max_size=25)
+        pending = asyncio.get_event_loop().create_future()
+        store.add('pending', pending)
+        for task_id in ('a', 'b', 'c'):
+            task = await _done_task(10)
+            store.add(task_id, task)
+            await asyncio.sleep(0)
+        # The oldest finished result is dropped, pending task is kept
+        assert 'a' not in store
+        assert 'b' in store and 'c' in store and 'pending' in store
+        assert store.as_dict['results_size'] == 20
+
+        entry = store.pop('b')
+        entry.task.result().close()
+        assert store.as_dict['results_size'] == 10
+        store.clear()
+        assert pending.cancelled() and len(store) == 0
+
+    asyncio.run(main())
+
+
+def test_result_long_poll():
+    async def main():
+        app = create_app(DSModel)
+        async with TestClient(TestServer(app.app)) as client:
+            resp = await client.post(
+                '/predict?async=true', data=image_form(),
+                headers={'Accept': 'application/json'})
+            task_id = (await resp.json())['task_id']
+
+            resp = await client.post('/status', json={
+                'task_ids': [task_id, 'unknown']})
+            assert (await resp.json())['tasks'] == {
+                task_id: 'pending', 'unknown': 'not_found'}
+
+            resp = await client.get('/result/{}?wait=0.05'.format(task_id))
+            assert (await resp.json())['errno'] == 9
+
+            model = await get_ds_model(app)
+            threading.Timer(0.1, model.release.set).start()
+            resp = await client.get('/result/{}?wait=5'.format(task_id))
+            assert await resp.json() == {'done': True}
+
+            resp = await client.post('/status', json={'task_ids': [task_id]})
+            assert (await resp.json())['tasks'] == {task_id: 'not_found'}
+
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from aiohttp import web, FormData
+from aiohttp.test_utils import TestServer, TestClient
+
+from .helpers import create_app, image_bytes
+
+DELAY = 0.5
+
+
+class DSModel:
+    def __init__(self, **kwargs):
+        pass
+
+    def predict(self, data, as_json=False):
+        return [[{'shape': list(obj.image.as_ndarray.shape)} for obj in objs]
+                for objs in data]
+
+
+async def _serve_image(_request):
+    await asyncio.sleep(DELAY)
+    return web.Response(body=image_bytes(), content_type='image/png')
+
+
+async def _predict_urls(count):
+    files = web.Application()
+    files.add_routes([web.get('/{name}', _serve_image)])
+    async with TestServer(files) as files_server:
+        async with TestClient(TestServer(create_app(
+                DSModel, input=('image', 'list')).app)) as client:
+            form = FormData()
+            for i in range(count):
+                form.add_field(
+                    'image-{}_url'.format(i),
+                    str(files_server.make_url('/{}.png'.format(i))))
+            started_at = time.monotonic()
+            resp = await client.post(
+                '/predict', data=form,
+                headers={'Accept': 'application/json'})
+            return resp.status, await resp.json(), \
+                   time.monotonic() - started_at
+
+
+def test_list_of_urls_is_fetched_concurrently():
+    count = 5
+
+    status, result, elapsed = asyncio.run(_predict_urls(count))
+
+    assert status == 200
+    assert result == [{'shape': [4, 6, 3]}] * count
+    assert elapsed < DELAY * 2
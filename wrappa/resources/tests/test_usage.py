@@ -0,0 +1,52 @@
+import asyncio
+import collections
+
+from ..usage import UsageStats
+
+
+class FakeCollection:
+    def __init__(self):
+        self.requests = []
+        self.fail = False
+
+    async def bulk_write(self, requests, ordered=True):
+        if self.fail:
+            raise ConnectionError('MongoDB is not available')
+        self.requests.extend(requests)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.usage_stats = collections.defaultdict(FakeCollection)
+
+
+def _incs(collection):
+    return {x._filter['token']: x._doc['$inc'] for x in collection.requests}
+
+
+def test_usage_is_flushed_in_bulk():
+    async def main():
+        db = FakeDatabase()
+        usage = UsageStats(db, flush_interval=0.05)
+        for _ in range(3):
+            usage.inc('a', 'total')
+        usage.inc('a', 'success')
+        usage.inc('b', 'total')
+        await asyncio.sleep(0.1)
+
+        for name in ('daily', 'monthly'):
+            assert _incs(db.usage_stats[name]) == {
+                'a': {'total': 3, 'success': 1},
+                'b': {'total': 1},
+            }
+
+        # Counters which failed to be flushed are flushed on close
+        db.usage_stats['daily'].fail = True
+        usage.inc('a', 'total')
+        await asyncio.sleep(0.1)
+        db.usage_stats['daily'].fail = False
+        await usage.close()
+        assert len(db.usage_stats['daily'].requests) == 3
+        assert len(db.usage_stats['monthly'].requests) == 3
+
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer, TestClient
+
+from .helpers import create_app, image_form
+from ..webhooks import Webhooks
+
+
+def test_result_is_pushed_to_callback_url():
+    async def main():
+        received = []
+        delivered = asyncio.Event()
+
+        async def callback(request):
+            received.append((dict(request.headers), await request.json()))
+            # The first attempt fails, so delivery is retried
+            if len(received) == 1:
+                return web.Response(status=503)
+            delivered.set()
+            return web.Response()
+
+        callback_app = web.Application()
+        callback_app.add_routes([web.post('/callback', callback)])
+
+        app = create_app(
+            webhooks={'backoff': 0, 'allowed_hosts': ['127.0.0.0/8']})
+        async with TestServer(callback_app) as callback_server, \
+                TestClient(TestServer(app.app)) as client:
+            url = str(callback_server.make_url('/callback'))
+            resp = await client.post(
+                '/predict', params={'async': 'true', 'callback_url': url},
+                data=image_form(), headers={'Accept': 'application/json'})
+            task_id = (await resp.json())['task_id']
+
+            await asyncio.wait_for(delivered.wait(), 5)
+            headers, body = received[-1]
+            assert len(received) == 2
+            assert headers['X-Task-Id'] == task_id
+            assert headers['X-Result-Status'] == '200'
+            assert body == {'done': True}
+
+            # Delivered task is freed
+            resp = await client.get('/result/{}'.format(task_id))
+            assert resp.status == 404
+
+    asyncio.run(main())
+
+
+def test_callback_url_of_not_allowed_host_is_rejected():
+    async def main():
+        app = create_app()
+        async with TestClient(TestServer(app.app)) as client:
+            resp = await client.post(
+                '/predict', params={
+                    'async': 'true', 'callback_url': 'http://127.0.0.1/'},
+                data=image_form(), headers={'Accept': 'application/json'})
+            assert resp.status == 400
+
+    asyncio.run(main())
+
+
+def test_allowed_hosts():
+    webhooks = Webhooks(None, allowed_hosts=[
+        'callbacks.example.com', '*.example.org', '10.0.0.0/8', '::1'])
+
+    assert webhooks.is_allowed_url('https://callbacks.example.com/x')
+    assert webhooks.is_allowed_url('http://a.b.example.org:8080/')
+    assert webhooks.is_allowed_url('http://10.1.2.3/')
+    assert webhooks.is_allowed_url('http://[::1]:8000/')
+    assert not webhooks.is_allowed_url('http://example.org/')
+    assert not webhooks.is_allowed_url('http://169.254.169.254/')
+    assert not webhooks.is_allowed_url('http://localhost/')
+    assert not webhooks.is_allowed_url('ftp://callbacks.example.com/')
+
+
+def test_callback_url_requires_async():
+    async def main():
+        app = create_app()
+        async with TestClient(TestServer(app.app)) as client:
+            resp = await client.post(
+                '/predict', params={'callback_url': 'http://localhost/'},
+                headers={'Accept': 'application/json'})
+            assert resp.status == 400
+
+    asyncio.run(main())
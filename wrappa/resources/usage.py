@@ -0,0 +1,76 @@
+import asyncio
+import collections
+import datetime
+import sys
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+class UsageStats:
+    """Usage of the server by tokens.
+
+    Counters are aggregated in memory by token, label, day and month and
+    flushed to usage_stats database with bulk_write every flush_interval
+    seconds and on close, so requests never wait for MongoDB.
+    """
+
+    def __init__(self, db, flush_interval=5):
+        self._db = db
+        self.flush_interval = flush_interval
+        # (collection, token, date) -> Counter of labels
+        self._counts = collections.defaultdict(collections.Counter)
+        self._flusher = None
+        self._flushing = None
+
+    def inc(self, token, label):
+        now = datetime.datetime.utcnow()
+        self._counts['daily', token, int(now.strftime('%Y%m%d'))][label] += 1
+        self._counts['monthly', token, int(now.strftime('%Y%m'))][label] += 1
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Flush is not interrupted by close, so counters are not lost
+            self._flushing = asyncio.ensure_future(self.flush())
+            await asyncio.shield(self._flushing)
+
+    async def flush(self):
+        counts, self._counts = \
+            self._counts, collections.defaultdict(collections.Counter)
+        keys = collections.defaultdict(list)
+        for key in counts:
+            keys[key[0]].append(key)
+        for name, batch in keys.items():
+            requests = [
+                UpdateOne(
+                    {'token': token, 'date': date},
+                    {'$inc': dict(counts[name, token, date])},
+                    upsert=True)
+                for _, token, date in batch]
+            try:
+                await self._db.usage_stats[name].bulk_write(
+                    requests, ordered=False)
+            except Exception as e:
+                print(
+                    'Failed to flush usage stats: {error!r}'.format(error=e),
+                    file=sys.stderr)
+                if isinstance(e, BulkWriteError):
+                    failed = [batch[x['index']]
+                              for x in e.details['writeErrors']]
+                else:
+                    failed = batch
+                # Counters are flushed again next time
+                for key in failed:
+                    self._counts[key].update(counts[key])
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if self._flushing is not None:
+            await self._flushing
+        await self.flush()
@@ -0,0 +1,96 @@
+import asyncio
+import ipaddress
+import random
+import sys
+from urllib.parse import urlparse
+
+from aiohttp import ClientError
+
+# Codes of responses after which delivery is retried
+RETRY_STATUSES = {408, 425, 429}
+
+
+class Webhooks:
+    """Pushes rendered results of async tasks to callback urls through
+    the shared connection pool.
+
+    Delivery is retried up to retries times when callback server is not
+    reachable or responds with 5xx, 408, 425 or 429. Delays between
+    attempts grow exponentially from backoff up to max_backoff seconds.
+
+    Results are sent only to allowed_hosts: host names, *.domain
+    wildcards and networks of IP addresses, so clients can not make the
+    server send requests to internal addresses.
+    """
+
+    def __init__(self, http_client, retries=5, backoff=1, max_backoff=60,
+                 allowed_hosts=()):
+        self._http_client = http_client
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._hosts = set()
+        self._domains = []
+        self._networks = []
+        for host in allowed_hosts:
+            host = host.lower()
+            if host.startswith('*.'):
+                self._domains.append(host[1:])
+                continue
+            try:
+                self._networks.append(
+                    ipaddress.ip_network(host, strict=False))
+            except ValueError:
+                self._hosts.add(host)
+
+    def is_allowed_url(self, url):
+        parsed = urlparse(url)
+        host = parsed.hostname
+        if parsed.scheme not in ('http', 'https') or not host:
+            return False
+        if host in self._hosts \
+                or any(host.endswith(x) for x in self._domains):
+            return True
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            # Host names are not resolved to be matched against networks
+            return False
+        return any(address in x for x in self._networks)
+
+    def _delay(self, attempt):
+        delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+        # Jitter spreads retries of many tasks failed at once
+        return delay * random.uniform(0.5, 1)
+
+    async def _post(self, url, rendered, headers):
+        headers = dict(rendered.headers, **headers)
+        headers['Content-Length'] = str(rendered.body.size)
+        async with self._http_client.session.post(
+                url, data=rendered.body.iter_chunks(),
+                headers=headers) as resp:
+            await resp.read()
+            return resp.status
+
+    async def deliver(self, url, rendered, headers=None) -> bool:
+        """Sends rendered result, returns True if it's delivered"""
+        headers = dict(headers or {})
+        headers['X-Result-Status'] = str(rendered.status)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self._delay(attempt - 1))
+            try:
+                status = await self._post(url, rendered, headers)
+            except (ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+                continue
+            if status < 300:
+                return True
+            error = 'response status {}'.format(status)
+            if status < 500 and status not in RETRY_STATUSES:
+                break
+        print(
+            'Failed to deliver result to {url}: {error}'.format(
+                url=url, error=error),
+            file=sys.stderr)
+        return False
@@ -32,6 +32,11 @@ class FileStorage:
                     storagepath, prefix + '_file_' + suffix + t)
                 fpath = wo.image.save_to_disk(fpath)
                 data['file'] = fpath.replace(storagepath + '/', '')
+            if wo.tensor:
+                tpath = os.path.join(
+                    storagepath, prefix + '_tensor_' + suffix + t)
+                tpath = wo.tensor.save_to_disk(tpath)
+                data['tensor'] = tpath.replace(storagepath + '/', '')
             if wo.text:
                 data['text'] = wo.text.text
             return data
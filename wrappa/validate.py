@@ -5,7 +5,7 @@ import json
 import numpy as np
 
 from wrappa import read_config, WrappaFile, \
-    WrappaText, WrappaImage, WrappaObject
+    WrappaText, WrappaImage, WrappaObject, WrappaTensor
 
 
 def validate_output_spec(spec, v):
@@ -22,6 +22,11 @@ def validate_output_spec(spec, v):
             'Text provided in output spec, but result of prediction is type of {t}'.format(
                 t=type(v.text)
             ))
+    if 'tensor' in spec['output'] and not isinstance(v.tensor, WrappaTensor):
+        raise TypeError(
+            'Tensor provided in output spec, but result of prediction is type of {t}'.format(
+                t=type(v.tensor)
+            ))
     if 'file' in spec['output'] and (
         not isinstance(v.file, WrappaFile) or v.file.payload is None):
         raise TypeError(
@@ -53,6 +58,9 @@ def main():
                 'payload': default_bytes,
                 'ext': 'txt'
             }))
+        elif input_spec == 'tensor':
+            wo.set_value(WrappaTensor.init_from_ndarray(
+                np.zeros((3, 224, 224), dtype=np.float32)))
         elif input_spec == 'text':
             wo.set_value(WrappaText('Test'))
 